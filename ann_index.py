@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+ANN_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# Rows encoded or assigned per matrix product, which bounds the temporary dense arrays.
+BLOCK_ROWS = 1 << 16
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class AnnIndex:
+    """Approximate candidate retrieval for a RecipeIndex: SVD embeddings in an IVF index
+
+    The TF-IDF rows of the index are projected to a few dense dimensions with a
+    TruncatedSVD and normalised, then grouped into n_lists inverted lists by spherical
+    k-means. A query is projected the same way; only the rows of the n_probe lists whose
+    centroids are nearest to it are compared, and the closest of those by embedding are
+    the candidates that RecipeEngine re-scores exactly. index_version names the index the
+    lists were built for.
+    """
+
+    def __init__(self, term_vectors, centroids, list_offsets, list_rows, embeddings,
+                 index_version, dataset_hash=None):
+        self.term_vectors = term_vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.embeddings = embeddings
+        self.index_version = index_version
+        self.dataset_hash = dataset_hash
+
+    @property
+    def n_components(self):
+        return self.term_vectors.shape[1]
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, index, n_components=128, n_lists=None, seed=0, train_size=100000, iterations=10):
+        """Fit the projection and the lists' centroids on (a sample of) an index and assign every row
+
+        n_lists defaults to the square root of the number of recipes. At most train_size
+        rows are sampled to fit the SVD and the centroids.
+        """
+        from sklearn.decomposition import TruncatedSVD
+        vectors = index.recipe_vectors
+        n_recipes, n_terms = vectors.shape
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n_recipes, min(n_recipes, train_size), replace=False))
+        n_components = cls._fitted_components(n_components, n_terms, len(sample))
+        svd = TruncatedSVD(n_components, random_state=seed).fit(vectors[sample])
+        term_vectors = np.ascontiguousarray(svd.components_.T, dtype=np.float32)
+
+        embeddings = cls._encode(vectors, term_vectors)
+        n_lists = max(1, min(n_lists or int(np.sqrt(n_recipes)), len(sample)))
+        points = embeddings[sample]
+        centroids = points[rng.choice(len(points), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(points @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, points)
+            filled = np.bincount(assignment, minlength=n_lists) > 0
+            # A list left empty keeps its old centroid.
+            centroids[filled] = _normalize(sums[filled])
+        return cls(term_vectors, centroids, *cls._assign(embeddings, centroids), embeddings,
+                   index.version, index.dataset_hash)
+
+    @staticmethod
+    def _fitted_components(n_components, n_terms, n_samples):
+        # TruncatedSVD needs fewer components than features and samples.
+        return max(1, min(n_components, n_terms - 1, n_samples - 1))
+
+    def can_reindex(self, index, n_components, train_size=100000):
+        """Whether reindex(index) gives the index train(index, n_components) would fit
+
+        That is when index has the same vocabulary, i.e. comes from the same dataset, and
+        the projection has the number of components train() would give it.
+        """
+        n_recipes, n_terms = index.recipe_vectors.shape
+        return (index.dataset_hash is not None and index.dataset_hash == self.dataset_hash
+                and self.n_components == self._fitted_components(n_components, n_terms,
+                                                                 min(n_recipes, train_size)))
+
+    def reindex(self, index):
+        """Assign the rows of another index with the same vocabulary, keeping the fitted projection
+
+        This is what a merge of runtime changes into the base index needs: far cheaper
+        than train(), since neither the SVD nor the centroids are refitted.
+        """
+        embeddings = self._encode(index.recipe_vectors, self.term_vectors)
+        return AnnIndex(self.term_vectors, self.centroids, *self._assign(embeddings, self.centroids),
+                        embeddings, index.version, index.dataset_hash)
+
+    @staticmethod
+    def _encode(vectors, term_vectors):
+        embeddings = np.empty((vectors.shape[0], term_vectors.shape[1]), dtype=np.float32)
+        for start in range(0, vectors.shape[0], BLOCK_ROWS):
+            block = vectors[start:start + BLOCK_ROWS] @ term_vectors
+            embeddings[start:start + BLOCK_ROWS] = _normalize(block)
+        return embeddings
+
+    @staticmethod
+    def _assign(embeddings, centroids):
+        """Return (list_offsets, list_rows): the rows nearest each centroid, list by list"""
+        assignment = np.empty(len(embeddings), dtype=np.int32)
+        for start in range(0, len(embeddings), BLOCK_ROWS):
+            block = embeddings[start:start + BLOCK_ROWS]
+            assignment[start:start + BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+        list_rows = np.argsort(assignment, kind='stable').astype(np.int64)
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=len(centroids)), out=list_offsets[1:])
+        return list_offsets, list_rows
+
+    def project(self, query_vectors):
+        """Normalised embeddings of a sparse queries x terms TF-IDF matrix"""
+        return _normalize(np.asarray(query_vectors @ self.term_vectors, dtype=np.float32))
+
+    def candidates(self, embedding, n_probe, n_candidates, mask=None):
+        """Rows of the n_candidates nearest recipes in the n_probe nearest lists, limited to mask"""
+        if not embedding.any():
+            return np.zeros(0, dtype=np.int64)
+        n_probe = min(n_probe, self.n_lists)
+        lists = np.argpartition(-(self.centroids @ embedding), n_probe - 1)[:n_probe]
+        rows = np.concatenate([self.list_rows[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists])
+        if mask is not None:
+            rows = rows[mask[rows]]
+        if len(rows) > n_candidates > 0:
+            similarity = self.embeddings[rows] @ embedding
+            rows = rows[np.argpartition(-similarity, n_candidates - 1)[:n_candidates]]
+        return rows
+
+    def save(self, path):
+        """Write the ANN index to a directory, replacing any previous one atomically"""
+        tmp_dir = f"{path}.tmp-{os.getpid()}"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        names = ("term_vectors", "centroids", "list_offsets", "list_rows", "embeddings")
+        for name in names:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+            json.dump({
+                "format_version": ANN_FORMAT_VERSION,
+                "created": time.time(),
+                "index_version": self.index_version,
+                "dataset_hash": self.dataset_hash,
+                "arrays": [f"{name}.npy" for name in names],
+            }, f, indent=2)
+
+        old_dir = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.rename(path, old_dir)
+        os.rename(tmp_dir, path)
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """Load an ANN index written with save(), or return None if there is no usable one"""
+        try:
+            with open(os.path.join(path, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("format_version") != ANN_FORMAT_VERSION:
+            return None
+        arrays = [np.load(os.path.join(path, name), mmap_mode='r' if mmap else None)
+                  for name in manifest["arrays"]]
+        return cls(*arrays, manifest["index_version"], manifest["dataset_hash"])
@@ -0,0 +1,49 @@
+"""Queries/sec of RecipeEngine.search_many vs. looping search_recipes"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlu import SimpleNLU
+from recipe_engine import RecipeEngine
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch', type=int, nargs='+', default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode="regex")
+    parsed = [nlu.extract_query_info(nlu.parse(q)) for q in QUERIES if q]
+    rng = random.Random(0)
+
+    print(f"\n{'batch':>7}{'loop q/s':>11}{'batch q/s':>11}{'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = RecipeEngine(write_dataset(os.path.join(tmp, "recipes.csv"), args.rows))
+        engine.result_cache.maxsize = 0
+        for size in args.batch:
+            sample = [rng.choice(parsed) for _ in range(size)]
+            queries = [q for q, _ in sample]
+            constraints_list = [c for _, c in sample]
+
+            start = time.perf_counter()
+            looped = [engine.search_recipes(q, c) for q, c in sample]
+            loop_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            batched = engine.search_many(queries, constraints_list)
+            batch_time = time.perf_counter() - start
+
+            assert [[r.id for r in rs] for rs in looped] == [[r.id for r in rs] for rs in batched]
+            print(f"{size:>7}{size / loop_time:>11.0f}{size / batch_time:>11.0f}{loop_time / batch_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Constraint filtering: inverted ingredient index vs. the iterrows + substring scan it replaced"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_engine import RecipeEngine
+from synthetic import write_dataset
+
+CONSTRAINTS = [
+    {"include_ingredients": "garlic"},
+    {"include_ingredients": "egg"},
+    {"include_ingredients": ["olive oil", "basil"]},
+    {"exclude_ingredients": ["pork", "shrimp"]},
+    {"exclude_ingredients": "pepper", "max_time": 30},
+    {"include_ingredients": "rice", "exclude_ingredients": "chicken", "max_time": 45},
+    {"max_time": 20},
+]
+
+
+def iterrows_filter(engine, constraints):
+    """The pre-index filter: one _meets_constraints call per DataFrame row"""
+    return [i for i, recipe in engine.recipes_df.iterrows() if engine._meets_constraints(recipe, constraints)]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"\n{'rows':>8}  {'constraints':<84}{'iterrows ms':>12}{'index ms':>10}{'token ms':>10}{'token diff':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            dataset_path = write_dataset(os.path.join(tmp, f"recipes_{n}.csv"), n)
+            engine = RecipeEngine(dataset_path)
+            token_engine = RecipeEngine(dataset_path, ingredient_match="token")
+            for constraints in CONSTRAINTS:
+                expected = iterrows_filter(engine, constraints)
+                assert engine._filter_by_constraints(constraints) == expected, constraints
+                token_diff = len(set(token_engine._filter_by_constraints(constraints)) ^ set(expected))
+                legacy = best_of(lambda: iterrows_filter(engine, constraints), args.repeat)
+                engine.index.constraints.clear_cache()
+                indexed = best_of(lambda: engine._constraint_mask(constraints), args.repeat)
+                token = best_of(lambda: token_engine._constraint_mask(constraints), args.repeat)
+                print(f"{n:>8}  {str(constraints):<84}{legacy * 1000:>12.1f}{indexed * 1000:>10.2f}"
+                      f"{token * 1000:>10.2f}{token_diff:>11}")
+
+
+if __name__ == "__main__":
+    main()
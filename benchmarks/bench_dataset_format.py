@@ -0,0 +1,89 @@
+"""Load time and memory of the recipes CSV vs. the columnar .columns dataset (`python ingest.py`)
+
+"read" loads the columns the index uses (pandas read_csv with the engine's dtypes vs.
+read_columnar, which memory-maps them, so only pages it touches count) and reports the
+memory they take; "build" builds the whole index from each format, which adds the same
+tokenizing and TF-IDF fit to both, and reports its peak memory. Each measurement runs
+in a fresh process.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_dataset
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_child(step, dataset_path):
+    import pandas as pd
+    from ingest import NUMERIC_COLUMNS, TEXT_COLUMNS, build_index_from_dataset, is_columnar, read_columnar
+
+    base_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    if step == "build":
+        loaded = build_index_from_dataset(dataset_path)
+    elif is_columnar(dataset_path):
+        loaded = read_columnar(dataset_path)
+    else:
+        loaded = pd.read_csv(dataset_path, usecols=TEXT_COLUMNS + NUMERIC_COLUMNS,
+                             dtype={name: str for name in TEXT_COLUMNS + NUMERIC_COLUMNS})
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        "seconds": seconds,
+        # What the loaded data holds for reads; the peak while building for builds.
+        "memory_mb": (rss_mb() - base_rss if step == "read"
+                      else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - base_peak),
+    }))
+    del loaded
+
+
+def measure(step, path):
+    proc = subprocess.run([sys.executable, __file__, '--child', step, path],
+                          capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 300000])
+    parser.add_argument('--dataset', help='Benchmark an existing CSV instead of synthetic data')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    from ingest import COLUMNAR_EXTENSION, convert_csv, dataset_size
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datasets = [args.dataset] if args.dataset else [
+            write_dataset(os.path.join(tmp, f"recipes_{n}.csv"), n) for n in args.rows]
+        print(f"\n{'dataset':<22}{'format':<9}{'MiB':>8}{'read s':>9}{'read MiB':>10}"
+              f"{'build s':>9}{'build peak MiB':>16}")
+        for csv_path in datasets:
+            columnar_path = convert_csv(csv_path, os.path.join(tmp, os.path.basename(csv_path) + COLUMNAR_EXTENSION))
+            for name, path in (("csv", csv_path), ("columns", columnar_path)):
+                read, build = measure("read", path), measure("build", path)
+                print(f"{os.path.basename(csv_path):<22}{name:<9}{dataset_size(path) / 2**20:>8.1f}"
+                      f"{read['seconds']:>9.2f}{read['memory_mb']:>10.1f}"
+                      f"{build['seconds']:>9.2f}{build['memory_mb']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Swap time and search latency while RecipeEngine.refresh() swaps in a new index
+
+Searches run back to back on one thread while another refreshes the engine after the
+dataset changed, either building the new index itself ("build", what the one worker that
+wins the build lock does) or loading the index another process already saved ("load",
+what every other worker does).
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nlu import SimpleNLU
+from recipe_engine import RecipeEngine
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def replace_dataset(path, n_rows, seed):
+    tmp_path = f"{path}.new"
+    write_dataset(tmp_path, n_rows, seed)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds of searches before and after a swap')
+    parser.add_argument('--mmap', action='store_true', help='memory-map the index, as gunicorn_config.py does')
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode="regex")
+    parsed = [nlu.extract_query_info(nlu.parse(q)) for q in QUERIES if q]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_dataset(os.path.join(tmp, "recipes.csv"), args.rows, seed=1)
+        engine = RecipeEngine(path, mmap=args.mmap)
+        engine.result_cache.maxsize = 0
+
+        print(f"\n{'swap':<7}{'seconds':>9}  {'p50 / p99 ms before':>20}{'during':>16}{'after':>16}{'max ms':>9}")
+        for seed, mode in ((2, "build"), (3, "load")):
+            samples = []
+            stop = threading.Event()
+
+            def search_loop():
+                rng = random.Random(seed)
+                while not stop.is_set():
+                    query, constraints = rng.choice(parsed)
+                    start = time.perf_counter()
+                    engine.search_recipes(query, constraints)
+                    samples.append((start, time.perf_counter() - start))
+
+            replace_dataset(path, args.rows, seed)
+            if mode == "load":
+                # Another process builds and saves the index for the new dataset first.
+                subprocess.run([sys.executable, '-c', 'import sys; from recipe_engine import RecipeEngine; '
+                                'RecipeEngine(sys.argv[1])', path], cwd=ROOT, check=True, capture_output=True)
+
+            searcher = threading.Thread(target=search_loop)
+            searcher.start()
+            time.sleep(args.settle)
+            swap_start = time.perf_counter()
+            engine.refresh()
+            swap_end = time.perf_counter()
+
+            time.sleep(args.settle)
+            stop.set()
+            searcher.join()
+
+            def window(lo, hi):
+                ms = np.array([d for t, d in samples if lo <= t < hi]) * 1000
+                if not len(ms):
+                    return "-"
+                return f"{np.percentile(ms, 50):.1f} / {np.percentile(ms, 99):.1f}"
+
+            ms = [d * 1000 for t, d in samples if swap_start <= t < swap_end]
+            print(f"{mode:<7}{swap_end - swap_start:>9.2f}  {window(0, swap_start):>20}"
+                  f"{window(swap_start, swap_end):>16}{window(swap_end, float('inf')):>16}"
+                  f"{max(ms, default=0):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
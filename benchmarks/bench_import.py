@@ -0,0 +1,80 @@
+"""Process startup: import time of main.py, `main.py --help`, and time to the CLI prompt
+
+Each measurement runs in a fresh interpreter, in a directory whose data/recipes.csv is a
+synthetic dataset with its index already built. Import time is the cumulative figure
+that `python -X importtime` reports for main; time to prompt runs `main.py` with no
+arguments until it asks for the first request. --repo measures another checkout, e.g. a
+baseline.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import write_dataset
+
+PROMPT = b"What would you like to cook?"
+
+
+def import_seconds(repo, workdir):
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                           f'import sys; sys.path.insert(0, {repo!r}); import main'], cwd=workdir,
+                          capture_output=True, text=True)
+    for line in reversed(proc.stderr.splitlines()):
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'main':
+            return int(fields[1]) / 1e6
+    raise RuntimeError(proc.stderr.strip().splitlines()[-1:] or "import failed")
+
+
+def help_seconds(repo, workdir):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(repo, 'main.py'), '--help'], cwd=workdir,
+                   capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def prompt_seconds(repo, workdir):
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(repo, 'main.py')], cwd=workdir,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    while PROMPT not in output:
+        chunk = os.read(proc.stdout.fileno(), 4096)
+        if not chunk:
+            raise RuntimeError("main.py exited before prompting")
+        output += chunk
+    elapsed = time.perf_counter() - start
+    proc.communicate(b"exit\n")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repo', default=ROOT, help='checkout to measure')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    repo = os.path.abspath(args.repo)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_dataset(os.path.join(workdir, "data", "recipes.csv"), args.rows)
+        subprocess.run([sys.executable, '-c', f'import sys; sys.path.insert(0, {repo!r}); '
+                        'from recipe_engine import RecipeEngine; RecipeEngine()'],
+                       cwd=workdir, capture_output=True, check=True)
+        print(f"\n{repo}, {args.rows} recipes, median of {args.repeat} runs")
+        for name, measure in (("import main", import_seconds), ("main.py --help", help_seconds),
+                              ("time to CLI prompt", prompt_seconds)):
+            seconds = [measure(repo, workdir) for _ in range(args.repeat)]
+            print(f"{name:<20}{np.median(seconds):>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Latency of incremental recipe changes vs. a full rebuild, and search cost of the delta segment"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import build_index_from_csv
+from nlu import SimpleNLU
+from recipe_engine import RecipeEngine
+from queries import QUERIES
+from synthetic import generate_recipes, write_dataset
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def new_recipes(n, seed):
+    return [{name: row[name] for name in ('recipe_name', 'ingredients', 'instructions', 'cook_time')}
+            for row in generate_recipes(n, seed)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000])
+    parser.add_argument('--changes', type=int, default=200, help='changes of each kind to time')
+    parser.add_argument('--delta', type=int, nargs='+', default=[1000, 5000],
+                        help='delta segment sizes to time searches at')
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode="regex")
+    parsed = [nlu.extract_query_info(nlu.parse(q)) for q in QUERIES if q]
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            path = write_dataset(os.path.join(tmp, f"recipes_{n}.csv"), n)
+            rebuild_ms = timed(lambda: build_index_from_csv(path))
+            engine = RecipeEngine(path)
+            engine.merge_threshold = 0
+            engine.result_cache.maxsize = 0
+            recipes = iter(new_recipes(args.changes * 2 + max(args.delta), seed=n + 1))
+
+            print(f"\n{n} recipes, full rebuild {rebuild_ms:.0f} ms")
+            print(f"{'change':<10}{'p50 ms':>9}{'p99 ms':>9}")
+            added = []
+            timings = {'add': [], 'update': [], 'remove': []}
+            for _ in range(args.changes):
+                recipe = next(recipes)
+                timings['add'].append(timed(lambda: added.extend(engine.add_recipes([recipe]))))
+            for _ in range(args.changes):
+                recipe_id = rng.randrange(n)
+                timings['update'].append(timed(lambda: engine.update_recipe(recipe_id, {'cook_time': 15})))
+            for recipe_id in rng.sample(range(n), args.changes):
+                try:
+                    timings['remove'].append(timed(lambda: engine.remove_recipes([recipe_id])))
+                except KeyError:
+                    pass
+            for kind, values in timings.items():
+                print(f"{kind:<10}{np.percentile(values, 50):>9.2f}{np.percentile(values, 99):>9.2f}")
+
+            def search_ms():
+                return np.mean([timed(lambda: engine.search_recipes(q, c)) for q, c in parsed])
+
+            merge_ms = timed(engine.merge_segments)
+            print(f"merge + save into base: {merge_ms:.0f} ms")
+            print(f"\n{'delta rows':>10}{'search ms':>11}")
+            print(f"{0:>10}{search_ms():>11.2f}")
+            for size in args.delta:
+                pending = size - engine.index_stats()['delta_recipes']
+                engine.add_recipes([next(recipes) for _ in range(pending)])
+                print(f"{size:>10}{search_ms():>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
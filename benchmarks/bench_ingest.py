@@ -0,0 +1,65 @@
+"""Peak RSS and wall time of building the recipe index: whole-file read_csv vs. chunked streaming"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_dataset
+
+
+def run_child(mode, dataset_path):
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from ingest import build_index_from_csv
+    from recipe_index import RecipeIndex
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "read_csv":
+        recipes_df = pd.read_csv(dataset_path)
+        recipes_df['recipe_text'] = recipes_df['recipe_name'].fillna('') + ' ' + recipes_df['ingredients'].fillna('')
+        vectorizer = TfidfVectorizer(stop_words='english')
+        recipe_vectors = vectorizer.fit_transform(recipes_df['recipe_text'])
+        RecipeIndex.build(recipes_df, vectorizer, recipe_vectors, dataset_path)
+    else:
+        build_index_from_csv(dataset_path)
+    print(json.dumps({
+        "seconds": time.perf_counter() - start,
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss) / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 300000])
+    parser.add_argument('--dataset', help='Benchmark an existing CSV instead of synthetic data')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datasets = [args.dataset] if args.dataset else [
+            write_dataset(os.path.join(tmp, f"recipes_{n}.csv"), n) for n in args.rows]
+        print(f"\n{'dataset':<22}{'MiB':>7}  {'mode':<10}{'seconds':>9}{'peak RSS MiB':>14}{'build growth MiB':>18}")
+        for path in datasets:
+            size_mb = os.path.getsize(path) / 2**20
+            for mode in ("read_csv", "streaming"):
+                proc = subprocess.run([sys.executable, __file__, '--child', mode, path],
+                                      capture_output=True, text=True, check=True)
+                r = json.loads(proc.stdout.strip().splitlines()[-1])
+                print(f"{os.path.basename(path):<22}{size_mb:>7.1f}  {mode:<10}{r['seconds']:>9.2f}"
+                      f"{r['peak_mb']:>14.1f}{r['growth_mb']:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Per-worker memory of forked search workers: private DataFrame/arrays vs. a shared mmap index"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_engine import RecipeEngine
+from synthetic import write_dataset
+
+QUERIES = [
+    ("chicken curry", {}),
+    ("pasta", {"include_ingredients": "garlic", "max_time": 30}),
+    ("beef tacos", {"exclude_ingredients": ["pork", "shrimp"]}),
+]
+
+
+def memory_kb():
+    """Return Rss, Pss and private (unshared) memory of this process in kB"""
+    stats = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                stats[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        "rss": stats["Rss"],
+        "pss": stats["Pss"],
+        "private": stats["Private_Clean"] + stats["Private_Dirty"],
+    }
+
+
+def run_worker(mode, dataset_path, engine, write_fd):
+    if engine is None:
+        engine = RecipeEngine(dataset_path, mmap=False)
+        if mode == "dataframe":
+            engine.recipes_df
+    for query, constraints in QUERIES:
+        engine.search_recipes(query, constraints)
+    os.write(write_fd, json.dumps(memory_kb()).encode())
+    os._exit(0)
+
+
+def measure(mode, dataset_path, workers):
+    engine = RecipeEngine(dataset_path, mmap=True) if mode == "shared" else None
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            run_worker(mode, dataset_path, engine, write_fd)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+    samples = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as f:
+            samples.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    return {key: sum(s[key] for s in samples) / len(samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--dataset', help='Benchmark an existing CSV instead of synthetic data')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_path = args.dataset or write_dataset(os.path.join(tmp, "recipes.csv"), args.rows)
+        RecipeEngine(dataset_path)
+        results = {mode: measure(mode, dataset_path, args.workers)
+                   for mode in ("dataframe", "private", "shared")}
+
+    print(f"\nPer-worker memory with {args.workers} workers (MiB)")
+    print(f"{'mode':<12}{'RSS':>10}{'PSS':>10}{'private':>10}")
+    for mode, stats in results.items():
+        print(f"{mode:<12}{stats['rss'] / 1024:>10.1f}{stats['pss'] / 1024:>10.1f}{stats['private'] / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Throughput and latency of micro-batched /search work vs. one search per request
+
+Client threads submit queries back to back, as request threads do in main.py: either one
+parse + search_recipes per query on a BoundedExecutor (SEARCH_BATCH_WINDOW_MS unset), or
+through a MicroBatcher that runs parse_many + search_many over the queries arriving within
+each window. Caches are off so every query is parsed and scored.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlu import SimpleNLU
+from recipe_engine import RecipeEngine
+from serving import BoundedExecutor, MicroBatcher
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def run_clients(submit, concurrency, duration, seed=0):
+    """Submit queries from concurrency threads for duration seconds; returns (q/s, latencies ms)"""
+    latencies = [[] for _ in range(concurrency)]
+    deadline = time.perf_counter() + duration
+
+    def client(i):
+        rng = random.Random(seed + i)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            submit(rng.choice(QUERIES)).result()
+            latencies[i].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ms = np.concatenate([np.array(l) for l in latencies]) * 1000
+    return len(ms) / elapsed, ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--window-ms', type=float, nargs='+', default=[0, 1, 2, 5, 10])
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--workers', type=int, default=2, help='threads of the unbatched executor')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--nlu-mode', default='regex')
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode=args.nlu_mode)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = RecipeEngine(write_dataset(os.path.join(tmp, "recipes.csv"), args.rows))
+        engine.result_cache.maxsize = 0
+
+        def search_one(query):
+            return engine.search_recipes(*nlu.extract_query_info(nlu.parse(query)))
+
+        def search_batch(queries):
+            if len(queries) == 1:
+                return [search_one(queries[0])]
+            parsed = [nlu.extract_query_info(p) for p in nlu.parse_many(queries)]
+            return engine.search_many([q for q, _ in parsed], [c for _, c in parsed])
+
+        executor = BoundedExecutor(args.workers, 1 << 20)
+        modes = [(f"{args.workers} workers", lambda q: executor.submit(search_one, q))]
+        for window_ms in args.window_ms:
+            batcher = MicroBatcher(search_batch, window_ms / 1000, args.max_batch, 1 << 20)
+            modes.append((f"batch {window_ms:g} ms", batcher.submit))
+
+        print(f"\n{'mode':<14}{'clients':>8}{'q/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'avg batch':>11}")
+        for label, submit in modes:
+            for concurrency in args.concurrency:
+                batcher = getattr(submit, '__self__', None)
+                before = batcher.stats() if batcher else None
+                qps, ms = run_clients(submit, concurrency, args.duration)
+                if batcher:
+                    after = batcher.stats()
+                    avg_batch = (after['completed'] - before['completed']) / max(after['batches'] - before['batches'], 1)
+                    avg_batch = f"{avg_batch:.1f}"
+                else:
+                    avg_batch = "-"
+                print(f"{label:<14}{concurrency:>8}{qps:>9.0f}{np.percentile(ms, 50):>9.2f}"
+                      f"{np.percentile(ms, 99):>9.2f}{avg_batch:>11}")
+
+
+if __name__ == "__main__":
+    main()
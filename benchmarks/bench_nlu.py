@@ -0,0 +1,66 @@
+"""Startup time, memory and per-parse latency of SimpleNLU in each loading mode"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queries import QUERIES
+
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def run_child(mode, repeat):
+    base_rss = rss_kb()
+    start = time.perf_counter()
+    from nlu import SimpleNLU
+    nlu = SimpleNLU(mode=mode)
+    init = time.perf_counter() - start
+    nlu.parse(QUERIES[0])
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            nlu.parse(query)
+    per_parse = (time.perf_counter() - start) / (repeat * len(QUERIES))
+    print(json.dumps({
+        "init": init, "first": first, "per_parse": per_parse,
+        "rss_mb": (rss_kb() - base_rss) / 1024, "spacy": "spacy" in sys.modules,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', nargs='+', default=["eager", "lazy", "regex"])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.repeat)
+        return
+
+    print(f"\n{'mode':<8}{'init s':>9}{'1st parse s':>13}{'RSS MiB':>10}{'parse us':>11}  spaCy imported")
+    for mode in args.modes:
+        proc = subprocess.run([sys.executable, __file__, '--child', mode, '--repeat', str(args.repeat)],
+                              capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            error = proc.stderr.strip().splitlines()[-1:] or ['failed']
+            print(f"{mode:<8}  error: {error[0]}")
+            continue
+        r = json.loads(lines[-1])
+        print(f"{mode:<8}{r['init']:>9.2f}{r['first']:>13.2f}{r['rss_mb']:>10.1f}{r['per_parse'] * 1e6:>11.1f}  {r['spacy']}")
+
+
+if __name__ == "__main__":
+    main()
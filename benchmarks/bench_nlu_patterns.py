@@ -0,0 +1,88 @@
+"""Golden-corpus check and parses/sec of SimpleNLU's pattern matching vs. the per-pattern re.search loop"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlu import SimpleNLU
+from queries import QUERIES
+
+
+def legacy_parse(nlu, text):
+    """The pattern part of SimpleNLU.parse before the keyword scanner (regex mode)"""
+    text = text.lower()
+    intent = "unknown"
+    for pattern in nlu.patterns['request_recipe']:
+        if re.search(pattern, text, re.IGNORECASE):
+            intent = "request_recipe"
+            break
+    entities = []
+    for pattern in nlu.patterns['request_recipe']:
+        matches = re.search(pattern, text, re.IGNORECASE)
+        if matches and len(matches.groups()) > 0:
+            entities.append({"entity": "dish", "value": matches.groups()[-1].strip()})
+            break
+    for pattern in nlu.patterns['time_constraint']:
+        matches = re.search(pattern, text, re.IGNORECASE)
+        if matches:
+            value = matches.group(1)
+            entities.append({"entity": "time", "value": int(value) if value.isdigit() else value})
+    for pattern in nlu.patterns['exclude_ingredient']:
+        matches = re.search(pattern, text, re.IGNORECASE)
+        if matches and len(matches.groups()) > 0:
+            entities.append({"entity": "exclude_ingredient", "value": matches.groups()[-1].strip()})
+    for pattern in nlu.patterns['include_ingredient']:
+        matches = re.search(pattern, text, re.IGNORECASE)
+        if matches:
+            entities.append({"entity": "include_ingredient", "value": matches.group(1).strip()})
+    return {"intent": intent, "entities": entities, "text": text}
+
+
+def golden_corpus(n_random, seed=7):
+    """The shared queries plus random recombinations of their words and pattern keywords"""
+    rng = random.Random(seed)
+    words = sorted({w for q in QUERIES for w in q.split()} | {
+        "no", "with", "without", "under", "minutes", "minute", "don't", "dont", "has", "using", "how",
+        "to", "do", "i", "make", "cook", "recipes", "show", "me", "recipe", "for", "want", "prepare",
+        "ſhow", "İ", "15", "٣", "nothing", "casino", "withhold", "piano", "45min",
+    })
+    corpus = list(QUERIES)
+    for _ in range(n_random):
+        corpus.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 12))))
+    return corpus
+
+
+def parses_per_second(parse, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            parse(text)
+    return repeat * len(corpus) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--random', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode="regex")
+    corpus = golden_corpus(args.random)
+    mismatches = [text for text in corpus if nlu.parse(text) != legacy_parse(nlu, text)]
+    print(f"golden corpus: {len(corpus)} queries, {len(mismatches)} mismatches")
+    for text in mismatches[:10]:
+        print(f"  {text!r}: {nlu.parse(text)} != {legacy_parse(nlu, text)}")
+
+    legacy = parses_per_second(lambda t: legacy_parse(nlu, t), QUERIES, args.repeat * 10)
+    scanned = parses_per_second(nlu.parse, QUERIES, args.repeat * 10)
+    print(f"per-pattern re.search: {legacy:>10.0f} parses/s")
+    print(f"keyword scan + compiled: {scanned:>8.0f} parses/s ({scanned / legacy:.1f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Texts/sec of SimpleNLU.parse in a loop vs. parse_many with n_process = 1..N"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlu import SimpleNLU
+from queries import QUERIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mode', default='eager', help='SimpleNLU mode (eager, lazy or regex)')
+    parser.add_argument('--texts', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--n-process', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode=args.mode)
+    texts = list(itertools.islice(itertools.cycle(q for q in QUERIES if q), args.texts))
+    nlu.parse(texts[0])
+
+    start = time.perf_counter()
+    expected = [nlu.parse(text) for text in texts]
+    loop_rate = len(texts) / (time.perf_counter() - start)
+
+    print(f"\n{len(texts)} texts, mode {args.mode}, {os.cpu_count()} CPUs")
+    print(f"{'method':<22}{'texts/s':>10}{'speedup':>9}")
+    print(f"{'parse() loop':<22}{loop_rate:>10.0f}{1:>9.2f}")
+    for n_process in args.n_process:
+        start = time.perf_counter()
+        parsed = nlu.parse_many(texts, batch_size=args.batch_size, n_process=n_process)
+        rate = len(texts) / (time.perf_counter() - start)
+        assert parsed == expected, "parse_many() disagrees with parse()"
+        print(f"{f'parse_many n_process={n_process}':<22}{rate:>10.0f}{rate / loop_rate:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Exact search latency with and without max-score pruning (RECIPE_PRUNING), by query length
+
+Queries of each length are random terms of the index vocabulary; "sample" are the sample
+user queries. Results are checked to be identical.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlu import SimpleNLU
+from recipe_engine import RecipeEngine
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def timed_search(engine, parsed, top_n):
+    results, latencies = [], []
+    for query, constraints in parsed:
+        start = time.perf_counter()
+        results.append([(r.id, r.match_score) for r in engine.search_recipes(query, constraints, top_n)])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000])
+    parser.add_argument('--lengths', type=int, nargs='+', default=[1, 2, 3, 5, 8])
+    parser.add_argument('--queries', type=int, default=200, help='queries per length')
+    parser.add_argument('--top-n', type=int, default=3)
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode="regex")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            engine = RecipeEngine(write_dataset(os.path.join(tmp, f"recipes_{n}.csv"), n))
+            engine.result_cache.maxsize = 0
+            vocabulary = engine.index.vocabulary
+            rng = random.Random(0)
+            groups = [("sample", [nlu.extract_query_info(nlu.parse(q)) for q in QUERIES if q])]
+            for length in args.lengths:
+                groups.append((f"{length} terms", [(" ".join(rng.sample(vocabulary, length)), None)
+                                                   for _ in range(args.queries)]))
+
+            print(f"\n{n} recipes, top {args.top_n}")
+            print(f"{'queries':<10}{'full ms':>9}{'pruned ms':>11}{'p99 full':>10}{'p99 pruned':>12}{'speedup':>9}")
+            for label, parsed in groups:
+                engine.pruning = False
+                expected, full = timed_search(engine, parsed, args.top_n)
+                engine.pruning = True
+                found, pruned = timed_search(engine, parsed, args.top_n)
+                assert found == expected, "pruned results differ from the full product"
+                print(f"{label:<10}{full.mean():>9.2f}{pruned.mean():>11.2f}{np.percentile(full, 99):>10.2f}"
+                      f"{np.percentile(pruned, 99):>12.2f}{full.mean() / pruned.mean():>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""End-to-end /search latency through a coordinator and 1, 2 or 4 shard servers
+
+Every server is a local gunicorn process (gunicorn_config.py, one worker): a single
+server over the whole catalog as the reference, then for each shard count that many
+shard servers (RECIPE_SHARD=i/n) behind a coordinator (SEARCH_SHARDS). Requests go over
+one kept-alive connection, one at a time, with result and parse caches off, and every
+response is checked against the single server's. Last, one shard of the largest setup
+is stopped to time the partial results the coordinator then returns.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def start_server(port, env, log_path):
+    env = {**os.environ, "PORT": str(port), "WEB_CONCURRENCY": "1", "NLU_MODE": "regex",
+           "RESULT_CACHE_SIZE": "0", "PARSE_CACHE_SIZE": "0", **env}
+    with open(log_path, 'ab') as log:
+        return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', 'main:app'],
+                                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+
+
+def wait_ready(port, process, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server on port {port} exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/cache/stats")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+def timed_searches(port, texts, repeat):
+    """Return the responses to the first pass and every request's latency in ms"""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    responses, latencies = [], []
+    for i in range(repeat + 1):
+        for text in texts:
+            start = time.perf_counter()
+            connection.request("GET", "/search?" + urllib.parse.urlencode({"query": text}))
+            response = connection.getresponse()
+            body = json.loads(response.read())
+            elapsed = time.perf_counter() - start
+            if i == 0:
+                responses.append(body)
+            else:
+                latencies.append(elapsed * 1000)
+    return responses, np.array(latencies)
+
+
+def report(label, latencies):
+    print(f"{label:<22}{latencies.mean():>9.2f}{np.percentile(latencies, 50):>9.2f}"
+          f"{np.percentile(latencies, 99):>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeat', type=int, default=10, help='passes over the sample queries')
+    parser.add_argument('--port', type=int, default=5400, help='first port to use')
+    args = parser.parse_args()
+    texts = [q for q in QUERIES if q]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_dataset(os.path.join(tmp, "recipes.csv"), args.rows)
+        log_path = os.path.join(tmp, "servers.log")
+        subprocess.run([sys.executable, '-c', 'from recipe_engine import RecipeEngine; import sys; '
+                        'RecipeEngine(sys.argv[1])', path], cwd=ROOT, capture_output=True, check=True)
+        ports = iter(range(args.port, args.port + 1000))
+
+        def launch(port, env):
+            return start_server(port, {"RECIPE_DATASET": path, **env}, log_path)
+
+        print(f"\n{args.rows} recipes, {len(texts)} sample queries x {args.repeat}, {os.cpu_count()} CPUs")
+        print(f"{'setup':<22}{'mean ms':>9}{'p50 ms':>9}{'p99 ms':>9}")
+        try:
+            port = next(ports)
+            single = launch(port, {})
+            wait_ready(port, single)
+            expected, latencies = timed_searches(port, texts, args.repeat)
+            report("single server", latencies)
+            stop([single])
+
+            for n in args.shards:
+                shard_ports = [next(ports) for _ in range(n)]
+                shards = [launch(shard_port, {"RECIPE_SHARD": f"{i}/{n}"}) for i, shard_port in enumerate(shard_ports)]
+                port = next(ports)
+                front = launch(port, {"SEARCH_SHARDS": ",".join(f"http://127.0.0.1:{p}" for p in shard_ports)})
+                try:
+                    for process, process_port in zip(shards + [front], shard_ports + [port]):
+                        wait_ready(process_port, process)
+                    found, latencies = timed_searches(port, texts, args.repeat)
+                    assert found == expected, f"results with {n} shards differ from the single server's"
+                    report(f"coordinator, {n} shards", latencies)
+                    if n == max(args.shards) and n > 1:
+                        stop([shards[-1]])
+                        found, latencies = timed_searches(port, texts, args.repeat)
+                        assert all(response.get('missing_shards') == 1 for response in found)
+                        report(f"  1 of {n} shards down", latencies)
+                finally:
+                    stop([process for process in shards + [front] if process.poll() is None])
+        except Exception:
+            with open(log_path) as log:
+                sys.stderr.write(log.read()[-4000:])
+            raise
+
+
+if __name__ == "__main__":
+    main()
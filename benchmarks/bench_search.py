@@ -0,0 +1,71 @@
+"""Latency of RecipeEngine.search_recipes vs. the full cosine + Python sort it replaced"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.metrics.pairwise import cosine_similarity
+
+from recipe_engine import RecipeEngine
+from synthetic import write_dataset
+
+QUERIES = [
+    ("chicken curry", {}),
+    ("spicy beef tacos", {}),
+    ("pasta", {"include_ingredients": "garlic"}),
+    ("vegan bowl", {"max_time": 30}),
+    ("creamy mushroom risotto", {"exclude_ingredients": ["pork", "shrimp"]}),
+]
+
+
+def legacy_top_indices(engine, query, constraints, top_n=3):
+    """The pre-vectorization ranking: cosine_similarity over every recipe and a full sorted()"""
+    query_vector = engine.vectorizer.transform([query])
+    similarity_scores = cosine_similarity(query_vector, engine.recipe_vectors).flatten()
+    filtered_indices = engine._filter_by_constraints(constraints)
+    if not filtered_indices:
+        filtered_indices = list(range(len(engine.index)))
+    top = sorted([(i, similarity_scores[i]) for i in filtered_indices],
+                 key=lambda x: x[1], reverse=True)[:top_n]
+    return [i for i, _ in top]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 200000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"\n{'rows':>8}  {'query':<26}{'legacy ms':>11}{'top-k ms':>10}{'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            engine = RecipeEngine(write_dataset(os.path.join(tmp, f"recipes_{n}.csv"), n))
+            engine.result_cache.maxsize = 0
+            for query, constraints in QUERIES:
+                expected = legacy_top_indices(engine, query, constraints)
+                got = [r.id for r in engine.search_recipes(query, constraints)]
+                assert got == expected, (query, got, expected)
+                # Time scoring and ranking only; constraint filtering is shared by both paths.
+                filter_by_constraints = engine._filter_by_constraints
+                cached = filter_by_constraints(constraints)
+                engine._filter_by_constraints = lambda c: cached
+                legacy = best_of(lambda: legacy_top_indices(engine, query, constraints), args.repeat)
+                topk = best_of(lambda: engine.search_recipes(query, constraints), args.repeat)
+                engine._filter_by_constraints = filter_by_constraints
+                print(f"{n:>8}  {query:<26}{legacy * 1000:>11.2f}{topk * 1000:>10.2f}{legacy / topk:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
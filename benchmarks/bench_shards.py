@@ -0,0 +1,103 @@
+"""Exact search latency and throughput by number of index shards (RECIPE_SHARDS)
+
+For each shard count the same queries (the sample queries and random 8-term ones) are
+searched one at a time for latency, then from --clients threads at once for throughput.
+Results are checked to be identical to the unsharded engine's, also when searched from a
+forked child after the parent has searched, as in a gunicorn worker of a preloading
+master. Shards search in parallel threads, so gains are bounded by the CPUs available
+(reported with the results); --no-pruning scores every recipe, which is where sharding
+matters most.
+"""
+import argparse
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlu import SimpleNLU
+from recipe_engine import RecipeEngine
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def search_all(engine, parsed, top_n):
+    results, latencies = [], []
+    for query, constraints in parsed:
+        start = time.perf_counter()
+        results.append([(r.id, r.match_score) for r in engine.search_recipes(query, constraints, top_n)])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+
+def check_after_fork(engine, parsed, top_n, expected, timeout=60):
+    """Search in a forked child of a process that has searched; fails if it hangs or differs"""
+    pid = os.fork()
+    if pid == 0:
+        signal.alarm(timeout)
+        try:
+            found, _ = search_all(engine, parsed, top_n)
+            os._exit(0 if found == expected else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    if os.WIFSIGNALED(status):
+        raise AssertionError(f"search in a forked child did not finish within {timeout}s")
+    assert os.WEXITSTATUS(status) == 0, "search in a forked child failed or gave other results"
+
+
+def throughput(engine, parsed, top_n, clients, repeat):
+    work = parsed * repeat
+    with ThreadPoolExecutor(clients) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda item: engine.search_recipes(item[0], item[1], top_n), work))
+        return len(work) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--queries', type=int, default=100, help='random 8-term queries')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent searches for throughput')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the queries for throughput')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--no-pruning', action='store_true', help='score every recipe (RECIPE_PRUNING=0)')
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode="regex")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_dataset(os.path.join(tmp, f"recipes_{args.rows}.csv"), args.rows)
+        expected = None
+        print(f"\n{args.rows} recipes, top {args.top_n}, {os.cpu_count()} CPUs, "
+              f"pruning {'off' if args.no_pruning else 'on'}, {args.clients} clients")
+        print(f"{'shards':<8}{'mean ms':>9}{'p50 ms':>9}{'p99 ms':>9}{'speedup':>9}{'queries/s':>11}")
+        for shards in args.shards:
+            engine = RecipeEngine(path, shards=shards)
+            engine.result_cache.maxsize = 0
+            engine.pruning = not args.no_pruning
+            if expected is None:
+                rng = random.Random(0)
+                parsed = [nlu.extract_query_info(nlu.parse(q)) for q in QUERIES if q]
+                parsed += [(" ".join(rng.sample(engine.index.vocabulary, 8)), None) for _ in range(args.queries)]
+                search_all(engine, parsed, args.top_n)
+                expected, latencies = search_all(engine, parsed, args.top_n)
+                single = latencies.mean()
+            else:
+                search_all(engine, parsed, args.top_n)
+                found, latencies = search_all(engine, parsed, args.top_n)
+                assert found == expected, f"results with {shards} shards differ from the first run"
+            check_after_fork(engine, parsed, args.top_n, expected)
+            rate = throughput(engine, parsed, args.top_n, args.clients, args.repeat)
+            print(f"{shards:<8}{latencies.mean():>9.2f}{np.percentile(latencies, 50):>9.2f}"
+                  f"{np.percentile(latencies, 99):>9.2f}{single / latencies.mean():>9.2f}{rate:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
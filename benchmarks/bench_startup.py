@@ -0,0 +1,44 @@
+"""Cold start vs. persisted-index start of RecipeEngine, and time to first request"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_engine import RecipeEngine
+from synthetic import write_dataset
+
+
+def time_start(dataset_path, query="chicken curry"):
+    start = time.perf_counter()
+    engine = RecipeEngine(dataset_path)
+    ready = time.perf_counter()
+    engine.search_recipes(query, {})
+    first = time.perf_counter()
+    return ready - start, first - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--dataset', help='Benchmark an existing CSV instead of synthetic data')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datasets = [args.dataset] if args.dataset else [
+            write_dataset(os.path.join(tmp, f"recipes_{n}.csv"), n) for n in args.rows]
+        rows = []
+        for path in datasets:
+            cold_init, cold_first = time_start(path)
+            warm_init, warm_first = time_start(path)
+            rows.append((os.path.basename(path), cold_init, cold_first, warm_init, warm_first))
+
+    print(f"\n{'dataset':<24}{'cold init':>12}{'cold 1st req':>14}{'index init':>12}{'index 1st req':>15}")
+    for name, cold_init, cold_first, warm_init, warm_first in rows:
+        print(f"{name:<24}{cold_init:>11.2f}s{cold_first:>13.2f}s{warm_init:>11.2f}s{warm_first:>14.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Memory footprint and per-hit materialization cost: pandas DataFrame rows vs. the columnar index"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from recipe_engine import RecipeEngine
+from recipe_index import RecipeRecord, TextColumn
+from synthetic import write_dataset
+
+
+def columns_nbytes(index):
+    total = 0
+    for column in index.columns.values():
+        arrays = column.arrays() if isinstance(column, TextColumn) else (column,)
+        total += sum(a.nbytes for a in arrays)
+    return total
+
+
+def per_hit(fn, ids):
+    start = time.perf_counter()
+    for idx in ids:
+        fn(idx)
+    return (time.perf_counter() - start) / len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--hits', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"\n{'rows':>8}{'DataFrame MiB':>15}{'columnar MiB':>14}{'Series us/hit':>15}{'record us/hit':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            engine = RecipeEngine(write_dataset(os.path.join(tmp, f"recipes_{n}.csv"), n))
+            df = engine.recipes_df
+            ids = np.random.default_rng(0).integers(0, n, args.hits).tolist()
+
+            def series_hit(idx):
+                recipe = df.iloc[idx].copy()
+                recipe['match_score'] = 0.5
+                return recipe
+
+            def record_hit(idx):
+                return RecipeRecord(idx, engine.index.record(idx), 0.5)
+
+            df_bytes = df.memory_usage(deep=True).sum()
+            print(f"{n:>8}{df_bytes / 2**20:>15.1f}{columns_nbytes(engine.index) / 2**20:>14.1f}"
+                  f"{per_hit(series_hit, ids) * 1e6:>15.1f}{per_hit(record_hit, ids) * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
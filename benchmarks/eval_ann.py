@@ -0,0 +1,80 @@
+"""Recall@k and latency of ANN retrieval (RECIPE_RETRIEVAL=ann) against exact search
+
+Every query runs through an exact engine and an ANN engine over the same index. recall@k
+is the share of the ANN results that belong in the exact top k: those scoring at least
+the exact k-th score, so a recipe tied with an exact result counts. "same" is the share
+of queries whose results are identical, ties broken the same way. Queries are the sample
+user queries plus recipe names drawn from the dataset.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlu import SimpleNLU
+from recipe_engine import RecipeEngine
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def run(engine, parsed, top_n):
+    results, latencies = [], []
+    for query, constraints in parsed:
+        start = time.perf_counter()
+        results.append([(recipe.id, recipe.match_score)
+                        for recipe in engine.search_recipes(query, constraints, top_n)])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--names', type=int, default=300, help='recipe names to add as queries')
+    parser.add_argument('--probe', type=int, nargs='+', default=[4, 16, 64, 128])
+    parser.add_argument('--candidates', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--components', type=int, default=128)
+    parser.add_argument('--lists', type=int, default=0, help='0 for the square root of --rows')
+    args = parser.parse_args()
+
+    nlu = SimpleNLU(mode="regex")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_dataset(os.path.join(tmp, "recipes.csv"), args.rows)
+        names = pd.read_csv(path, usecols=['recipe_name'])['recipe_name'].dropna().tolist()
+        texts = [q for q in QUERIES if q] + random.Random(0).sample(names, min(args.names, len(names)))
+        parsed = [nlu.extract_query_info(nlu.parse(text)) for text in texts]
+
+        exact = RecipeEngine(path, retrieval="exact")
+        exact.result_cache.maxsize = 0
+        os.environ["RECIPE_ANN_COMPONENTS"] = str(args.components)
+        os.environ["RECIPE_ANN_LISTS"] = str(args.lists)
+        start = time.perf_counter()
+        ann = RecipeEngine(path, retrieval="ann")
+        print(f"ANN engine ready in {time.perf_counter() - start:.2f}s")
+        ann.result_cache.maxsize = 0
+
+        expected, ms = run(exact, parsed, args.top_n)
+        print(f"\n{len(parsed)} queries, {args.rows} recipes, top {args.top_n}")
+        print(f"{'probe':>6}{'candidates':>12}{'recall@k':>10}{'same':>8}{'mean ms':>9}{'p99 ms':>9}")
+        print(f"{'exact':>18}{1:>10.3f}{1:>8.2f}{ms.mean():>9.2f}{np.percentile(ms, 99):>9.2f}")
+        for probe in args.probe:
+            for candidates in args.candidates:
+                ann.ann_probe, ann.ann_candidates = probe, candidates
+                found, ms = run(ann, parsed, args.top_n)
+                recall = np.mean([sum(score >= e[-1][1] for _, score in f) / len(e)
+                                  for f, e in zip(found, expected) if e])
+                same = np.mean([f == e for f, e in zip(found, expected)])
+                print(f"{probe:>6}{candidates:>12}{recall:>10.3f}{same:>8.2f}{ms.mean():>9.2f}"
+                      f"{np.percentile(ms, 99):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
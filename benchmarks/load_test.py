@@ -0,0 +1,141 @@
+"""Load test for GET /search: throughput, p50/p99 latency of OK responses and 503s by concurrency
+
+Either points at a running server (--url) or starts gunicorn with gunicorn_config.py on a
+synthetic dataset for each --worker-class and tests each in turn.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def run_clients(host, port, concurrency, duration, seed=0):
+    """Send /search requests from concurrency keep-alive clients for duration seconds"""
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    deadline = time.perf_counter() + duration
+
+    def client(i):
+        rng = random.Random(seed + i)
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        while time.perf_counter() < deadline:
+            path = '/search?query=' + urllib.parse.quote(rng.choice(QUERIES))
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=60)
+                status = 'error'
+            if status == 200:
+                latencies[i].append(time.perf_counter() - start)
+            statuses[i][status] = statuses[i].get(status, 0) + 1
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    totals = {}
+    for counts in statuses:
+        for status, n in counts.items():
+            totals[status] = totals.get(status, 0) + n
+    ms = np.concatenate([np.array(l) for l in latencies] + [[np.nan]]) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": sum(totals.values()),
+        "ok_per_s": totals.get(200, 0) / elapsed,
+        "p50_ms": float(np.nanpercentile(ms, 50)),
+        "p99_ms": float(np.nanpercentile(ms, 99)),
+        "busy_503": totals.get(503, 0),
+        "errors": sum(n for status, n in totals.items() if status not in (200, 503)),
+    }
+
+
+def start_server(workdir, port, worker_class, env_overrides):
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=worker_class,
+               PYTHONPATH=ROOT, **env_overrides)
+    env.setdefault("NLU_MODE", "regex")
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn_config.py'), 'main:app'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(600):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/search?query=warmup')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Test a running server, e.g. http://127.0.0.1:8000')
+    parser.add_argument('--worker-class', nargs='+', default=['sync', 'gthread'])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--env', nargs='*', default=[], metavar='NAME=VALUE',
+                        help='Environment for the started servers, e.g. WEB_CONCURRENCY=2')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+
+    def run(label, host, port):
+        print(f"\n{label}")
+        print(f"{'clients':>8}{'requests':>10}{'ok/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'503s':>7}{'errors':>8}")
+        for concurrency in args.concurrency:
+            r = run_clients(host, port, concurrency, args.duration)
+            results.append({"server": label, **r})
+            print(f"{concurrency:>8}{r['requests']:>10}{r['ok_per_s']:>9.0f}{r['p50_ms']:>9.1f}"
+                  f"{r['p99_ms']:>9.1f}{r['busy_503']:>7}{r['errors']:>8}")
+
+    if args.url:
+        url = urllib.parse.urlparse(args.url)
+        run(args.url, url.hostname, url.port or 80)
+    else:
+        env = dict(item.split('=', 1) for item in args.env)
+        with tempfile.TemporaryDirectory() as tmp:
+            write_dataset(os.path.join(tmp, 'data', 'recipes.csv'), args.rows)
+            for worker_class in args.worker_class:
+                server = start_server(tmp, args.port, worker_class, env)
+                try:
+                    run(worker_class, '127.0.0.1', args.port)
+                finally:
+                    server.terminate()
+                    server.wait()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Representative user queries shared by the NLU and end-to-end benchmarks"""
+
+QUERIES = [
+    "Show me a recipe for chocolate cake",
+    "I want something with pasta",
+    "Give me a quick breakfast idea",
+    "I need a recipe without dairy",
+    "recipe for chicken curry",
+    "how to make beef tacos",
+    "how do I cook mushroom risotto",
+    "show me vegan recipes",
+    "I want to make banana bread",
+    "I want to cook something spicy",
+    "I want to prepare a greek salad with feta",
+    "quick pasta with garlic",
+    "easy dinner using tofu",
+    "simple soup with carrots and no onions",
+    "something under 30 minutes with rice",
+    "dinner in 20 minutes",
+    "fast lunch without meat",
+    "recipe for lasagna without mushrooms",
+    "I don't like cilantro, show me tacos recipes",
+    "dont have eggs but want pancakes",
+    "what can I make that has chickpeas",
+    "chicken noodle soup",
+    "spicy thai curry with coconut milk under 45 minutes",
+    "recipe for apple pie using butter",
+    "show me quick breakfast recipes",
+    "no nuts please",
+    "pizza",
+    "beef stew with potatoes",
+    "How To Make Shrimp Scampi",
+    "RECIPE FOR VEGETABLE BIRYANI",
+    "easy cookies with chocolate chips",
+    "I want to make homemade pizza without pepperoni",
+    "give me something fast",
+    "salmon using lemon and no butter in 25 minutes",
+    "",
+    "?!",
+]
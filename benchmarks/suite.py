@@ -0,0 +1,184 @@
+"""Reproducible benchmark suite: engine startup, search, NLU parsing and /search end to end
+
+Every run generates the same synthetic corpora (fixed --seed, no network) at each size
+in --rows, from 10k up to 2M recipes, and times:
+
+  init_build          RecipeEngine() building its index from the CSV
+  init_load           RecipeEngine() loading the persisted index
+  search              search_recipes() for the sample queries, without constraints
+  search_constraints  search_recipes() for the sample queries that have constraints
+  nlu_parse           SimpleNLU.parse() of each sample query (once, not per size)
+  http_search         GET /search through the Flask test client
+
+Result caches are disabled so every search is computed. Timings are written as JSON
+(--output); with --baseline, each benchmark's median is compared with the baseline's,
+and the exit status is 1 if any is more than --threshold slower. --results compares an
+existing results file instead of running the suite.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from queries import QUERIES
+from synthetic import write_dataset
+
+
+def summarize(samples):
+    ms = np.array(samples) * 1000
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "min_ms": float(ms.min()),
+    }
+
+
+def timed(fn, args_list, repeat):
+    """Time fn(*args) for every args in args_list, repeat times over, after one warm-up pass"""
+    for args in args_list:
+        fn(*args)
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args, workdir):
+    os.environ["NLU_MODE"] = args.nlu_mode
+    from nlu import SimpleNLU
+    from recipe_engine import RecipeEngine
+
+    results = {}
+    nlu = SimpleNLU(mode=args.nlu_mode)
+    texts = [q for q in QUERIES if q]
+    results["nlu_parse"] = summarize(timed(nlu.parse, [(text,) for text in texts], args.repeat))
+    parsed = [nlu.extract_query_info(nlu.parse(text)) for text in texts]
+    plain = [(query, {}) for query, _ in parsed]
+    constrained = [(query, constraints) for query, constraints in parsed if constraints]
+
+    # /search is served by main.py's engine; the engine under test is swapped in for each size.
+    os.chdir(workdir)
+    import main
+    client = main.app.test_client()
+    main.parse_cache.maxsize = 0
+
+    for n in args.rows:
+        path = write_dataset(os.path.join(workdir, f"recipes_{n}.csv"), n, args.seed)
+        start = time.perf_counter()
+        engine = RecipeEngine(path)
+        results[f"init_build/{n}"] = summarize([time.perf_counter() - start])
+        loads = []
+        for _ in range(args.load_repeat):
+            start = time.perf_counter()
+            engine = RecipeEngine(path)
+            loads.append(time.perf_counter() - start)
+        results[f"init_load/{n}"] = summarize(loads)
+        engine.result_cache.maxsize = 0
+
+        results[f"search/{n}"] = summarize(timed(engine.search_recipes, plain, args.repeat))
+        results[f"search_constraints/{n}"] = summarize(
+            timed(engine.search_recipes, constrained, args.repeat))
+        main._recipe_engine = engine
+        results[f"http_search/{n}"] = summarize(
+            timed(lambda text: client.get('/search', query_string={'query': text}),
+                  [(text,) for text in texts], args.repeat))
+        print(f"{n} rows done", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print each benchmark's median against the baseline's; return the names that regressed"""
+    regressed = []
+    print(f"\n{'benchmark':<28}{'baseline ms':>13}{'current ms':>12}{'change':>9}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<28}{'-':>13}{current['p50_ms']:>12.3f}{'new':>9}")
+            continue
+        change = current['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+        flag = ""
+        if change > threshold:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28}{before['p50_ms']:>13.3f}{current['p50_ms']:>12.3f}{change:>+9.1%}{flag}")
+    for name in baseline.keys() - results.keys():
+        print(f"{name:<28}{baseline[name]['p50_ms']:>13.3f}{'-':>12}{'missing':>9}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help='corpus sizes, e.g. 10000 100000 1000000 2000000')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the queries per benchmark')
+    parser.add_argument('--load-repeat', type=int, default=3, help='index loads timed per size')
+    parser.add_argument('--nlu-mode', default='regex', help='SimpleNLU mode (eager, lazy or regex)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown of a median, as a fraction, that counts as a regression')
+    parser.add_argument('--results', help='compare this results file instead of running the suite')
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as f:
+            report = json.load(f)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = run_suite(args, workdir)
+        report = {
+            "meta": {
+                "created": time.time(),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "rows": args.rows,
+                "seed": args.seed,
+                "repeat": args.repeat,
+                "nlu_mode": args.nlu_mode,
+            },
+            "results": results,
+        }
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = compare(report["results"], baseline["results"], args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} benchmark(s) more than {args.threshold:.0%} slower: {', '.join(regressed)}")
+            sys.exit(1)
+    else:
+        print(f"\n{'benchmark':<28}{'n':>6}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, stats in report["results"].items():
+            print(f"{name:<28}{stats['n']:>6}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
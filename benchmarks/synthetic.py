@@ -0,0 +1,77 @@
+"""Deterministic synthetic recipe datasets for benchmarks (no network needed)"""
+import argparse
+import csv
+import os
+import random
+
+DISHES = [
+    'curry', 'stir fry', 'soup', 'stew', 'salad', 'pasta', 'pizza', 'tacos', 'burger', 'risotto',
+    'pie', 'cake', 'cookies', 'bread', 'lasagna', 'biryani', 'quiche', 'casserole', 'sandwich',
+    'omelette', 'pancakes', 'noodles', 'chili', 'wrap', 'bowl', 'skewers', 'muffins', 'tart',
+]
+STYLES = [
+    'spicy', 'creamy', 'classic', 'homemade', 'easy', 'vegan', 'vegetarian', 'grilled', 'roasted',
+    'baked', 'crispy', 'thai', 'indian', 'mexican', 'italian', 'greek', 'korean', 'smoky', 'lemon',
+]
+INGREDIENTS = [
+    'chicken', 'beef', 'pork', 'shrimp', 'salmon', 'tofu', 'eggs', 'milk', 'butter', 'cheese',
+    'parmesan cheese', 'mozzarella', 'feta cheese', 'flour', 'sugar', 'brown sugar', 'salt',
+    'black pepper', 'garlic', 'ginger', 'onion', 'red onion', 'tomatoes', 'tomato sauce', 'potatoes',
+    'carrots', 'celery', 'spinach', 'mushrooms', 'bell peppers', 'broccoli', 'zucchini', 'eggplant',
+    'rice', 'basmati rice', 'pasta', 'spaghetti', 'noodles', 'tortillas', 'black beans', 'chickpeas',
+    'lentils', 'coconut milk', 'heavy cream', 'yogurt', 'olive oil', 'vegetable oil', 'soy sauce',
+    'lemon juice', 'lime', 'cilantro', 'basil', 'oregano', 'thyme', 'cumin', 'turmeric',
+    'garam masala', 'curry powder', 'paprika', 'chili flakes', 'honey', 'vanilla extract',
+    'chocolate chips', 'baking soda', 'apples', 'bananas', 'peanuts', 'walnuts', 'avocado',
+]
+STEPS = [
+    'Preheat the oven to {t} degrees', 'Chop the {i}', 'Heat oil in a pan', 'Add the {i}',
+    'Stir in the {i}', 'Simmer for {m} minutes', 'Bake for {m} minutes', 'Season with salt and pepper',
+    'Mix the {i} and {j}', 'Serve hot', 'Garnish with {i}', 'Bring to a boil',
+]
+
+
+def generate_recipes(n_rows, seed=42):
+    """Yield n_rows synthetic recipe rows with the columns of data/recipes.csv"""
+    rng = random.Random(seed)
+    for _ in range(n_rows):
+        ingredients = rng.sample(INGREDIENTS, rng.randint(4, 12))
+        name = f"{rng.choice(STYLES).title()} {ingredients[0].title()} {rng.choice(DISHES).title()}"
+        steps = []
+        for _ in range(rng.randint(3, 8)):
+            steps.append(rng.choice(STEPS).format(
+                t=rng.choice([350, 375, 400, 425]), m=rng.randint(5, 60),
+                i=rng.choice(ingredients), j=rng.choice(ingredients)))
+        if rng.random() < 0.5:
+            ingredients_text = str(ingredients)
+            instructions_text = str([s + '.' for s in steps])
+        else:
+            ingredients_text = ', '.join(ingredients)
+            instructions_text = '. '.join(steps) + '.'
+        yield {
+            'recipe_name': name,
+            'ingredients': ingredients_text,
+            'instructions': instructions_text,
+            'cook_time': rng.choice([10, 15, 20, 25, 30, 35, 40, 45, 60, 75, 90, 120]),
+        }
+
+
+def write_dataset(path, n_rows, seed=42):
+    """Write a synthetic recipes CSV to path and return the path"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['recipe_name', 'ingredients', 'instructions', 'cook_time'])
+        writer.writeheader()
+        writer.writerows(generate_recipes(n_rows, seed))
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a synthetic recipes CSV')
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    write_dataset(args.path, args.rows, args.seed)
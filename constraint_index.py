@@ -0,0 +1,206 @@
+import re
+import threading
+from array import array
+from collections import OrderedDict
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+INGREDIENT_MATCH_MODES = ("substring", "token")
+# Bytes of substring-mode word rows kept per index, least recently used dropped first.
+WORD_ROWS_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class ConstraintIndex:
+    """Inverted ingredient-token index and sorted cook times for constraint filtering
+
+    Ingredient tokens are the alphanumeric runs of the lower-cased ingredients text, each
+    mapped to a sorted array of recipe ids. In "substring" mode (the default) a constraint
+    matches exactly like `ingredient.lower() in ingredients.lower()`: every recipe whose
+    text contains the ingredient has a token containing each of its words, so the postings
+    of those tokens give a candidate set that only needs a substring check when the
+    ingredient is more than a single word. In "token" mode each word of the ingredient must
+    be a whole token, so "egg" no longer matches "eggplant"; no text is checked at all.
+    A view() answers for the rows of a row_range only, renumbered from 0.
+    """
+
+    def __init__(self, tokens, postings_offsets, postings, time_order=None, sorted_times=None,
+                 row_range=None, token_ids=None):
+        self.tokens = tokens
+        self.postings_offsets = postings_offsets
+        self.postings = postings
+        self.time_order = time_order
+        self.sorted_times = sorted_times
+        self.row_range = row_range
+        self._token_ids = token_ids if token_ids is not None else {token: i for i, token in enumerate(tokens)}
+        self._word_rows = OrderedDict()
+        self._word_rows_bytes = 0
+        self._word_rows_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, ingredients, cook_times=None):
+        """Build the index from an iterable of ingredients strings and an optional cook time array"""
+        builder = ConstraintIndexBuilder()
+        builder.add(ingredients)
+        return builder.finish(cook_times)
+
+    @classmethod
+    def merge(cls, indexes, keeps, cook_times=None):
+        """Combine the indexes of consecutive segments, keeping the recipes set in keeps
+
+        Postings are renumbered to the rows of the concatenated kept recipes, so no
+        ingredients text is tokenized again.
+        """
+        renumbered = []
+        start = 0
+        for keep in keeps:
+            renumbered.append(np.cumsum(keep, dtype=np.int64) - 1 + start)
+            start += int(np.count_nonzero(keep))
+        tokens = sorted(set().union(*[index.tokens for index in indexes]))
+        parts = []
+        lengths = np.zeros(len(tokens), dtype=np.int64)
+        for i, token in enumerate(tokens):
+            for index, keep, rows in zip(indexes, keeps, renumbered):
+                postings = index.token_postings(token)
+                if len(postings):
+                    postings = rows[postings[keep[postings]]]
+                    parts.append(postings)
+                    lengths[i] += len(postings)
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        postings = np.concatenate(parts).astype(np.int32) if parts else np.zeros(0, dtype=np.int32)
+        tokens = [token for token, length in zip(tokens, lengths) if length]
+        offsets = np.concatenate([[0], offsets[1:][lengths > 0]])
+
+        time_order = sorted_times = None
+        if cook_times is not None:
+            time_order = np.argsort(cook_times, kind='stable').astype(np.int32)
+            sorted_times = np.asarray(cook_times)[time_order]
+        return cls(tokens, offsets, postings, time_order, sorted_times)
+
+    def view(self, first, stop):
+        """Return the index of rows first to stop, sharing this one's arrays"""
+        return ConstraintIndex(self.tokens, self.postings_offsets, self.postings, self.time_order,
+                               self.sorted_times, (first, stop), self._token_ids)
+
+    def token_postings(self, token):
+        """Return the sorted recipe ids whose ingredients contain token"""
+        i = self._token_ids.get(token)
+        if i is None:
+            return self.postings[:0]
+        postings = self.postings[self.postings_offsets[i]:self.postings_offsets[i + 1]]
+        if self.row_range is not None:
+            first, stop = np.searchsorted(postings, self.row_range)
+            postings = postings[first:stop] - self.row_range[0]
+        return postings
+
+    def word_rows(self, word, n_recipes, mode="substring"):
+        """Return the sorted recipe ids with a token matching word under mode
+
+        In token mode these are the word's postings. In substring mode they are the union
+        of the postings of every token containing word, which takes a scan of the
+        vocabulary, so they are cached up to WORD_ROWS_CACHE_BYTES.
+        """
+        if mode == "token":
+            return self.token_postings(word)
+        with self._word_rows_lock:
+            rows = self._word_rows.get(word)
+            if rows is not None:
+                self._word_rows.move_to_end(word)
+                return rows
+        matching = [token for token in self.tokens if word in token]
+        if len(matching) == 1:
+            rows = self.token_postings(matching[0])
+        else:
+            mask = np.zeros(n_recipes, dtype=bool)
+            for token in matching:
+                mask[self.token_postings(token)] = True
+            rows = np.flatnonzero(mask).astype(np.int32)
+        with self._word_rows_lock:
+            if word not in self._word_rows and rows.nbytes <= WORD_ROWS_CACHE_BYTES:
+                self._word_rows[word] = rows
+                self._word_rows_bytes += rows.nbytes
+                while self._word_rows_bytes > WORD_ROWS_CACHE_BYTES:
+                    _, dropped = self._word_rows.popitem(last=False)
+                    self._word_rows_bytes -= dropped.nbytes
+        return rows
+
+    def clear_cache(self):
+        """Drop the cached substring-mode word rows"""
+        with self._word_rows_lock:
+            self._word_rows.clear()
+            self._word_rows_bytes = 0
+
+    def ingredient_mask(self, ingredient, texts, mode="substring"):
+        """Return a boolean mask of recipes whose ingredients match ingredient
+
+        texts is the ingredients column, used to confirm candidates that the token
+        postings alone cannot decide in substring mode.
+        """
+        n_recipes = len(texts)
+        ingredient = ingredient.lower()
+        words = TOKEN_PATTERN.findall(ingredient)
+        if not words:
+            candidates = np.ones(n_recipes, dtype=bool)
+        else:
+            candidates = np.zeros(n_recipes, dtype=bool)
+            candidates[self.word_rows(words[0], n_recipes, mode)] = True
+            for word in words[1:]:
+                matches = np.zeros(n_recipes, dtype=bool)
+                matches[self.word_rows(word, n_recipes, mode)] = True
+                candidates &= matches
+        if mode == "token" or (len(words) == 1 and words[0] == ingredient):
+            return candidates
+
+        for i in np.flatnonzero(candidates):
+            text = texts[i]
+            if not isinstance(text, str) or ingredient not in text.lower():
+                candidates[i] = False
+        return candidates
+
+    def max_time_mask(self, max_time, n_recipes):
+        """Return a boolean mask of recipes whose cook time is not above max_time"""
+        mask = np.ones(n_recipes, dtype=bool)
+        start = np.searchsorted(self.sorted_times, max_time, side='right')
+        stop = len(self.sorted_times)
+        if self.sorted_times.dtype.kind == 'f':
+            # NaN cook times sort last and, as before, never count as too slow.
+            stop -= int(np.count_nonzero(np.isnan(self.sorted_times)))
+        rows = self.time_order[start:stop]
+        if self.row_range is not None:
+            first, last = self.row_range
+            rows = rows[(rows >= first) & (rows < last)] - first
+        mask[rows] = False
+        return mask
+
+
+class ConstraintIndexBuilder:
+    """Accumulates ingredient token postings chunk by chunk for a ConstraintIndex"""
+
+    def __init__(self):
+        self.token_postings = {}
+        self.n_recipes = 0
+
+    def add(self, ingredients):
+        """Add the ingredients strings of the next recipes, in recipe order"""
+        for text in ingredients:
+            if isinstance(text, str):
+                for token in set(TOKEN_PATTERN.findall(text.lower())):
+                    postings = self.token_postings.get(token)
+                    if postings is None:
+                        postings = self.token_postings[token] = array('i')
+                    postings.append(self.n_recipes)
+            self.n_recipes += 1
+
+    def finish(self, cook_times=None):
+        tokens = sorted(self.token_postings)
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum([len(self.token_postings[t]) for t in tokens], out=offsets[1:])
+        postings = np.empty(offsets[-1], dtype=np.int32)
+        for i, token in enumerate(tokens):
+            postings[offsets[i]:offsets[i + 1]] = np.frombuffer(self.token_postings[token], dtype=np.int32)
+
+        time_order = sorted_times = None
+        if cook_times is not None:
+            time_order = np.argsort(cook_times, kind='stable').astype(np.int32)
+            sorted_times = np.asarray(cook_times)[time_order]
+        return ConstraintIndex(tokens, offsets, postings, time_order, sorted_times)
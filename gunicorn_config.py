@@ -4,10 +4,42 @@ bind = "0.0.0.0:" + os.environ.get("PORT", "8000")
 
 workers = int(os.environ.get("WEB_CONCURRENCY", 3))
 
+# Each gthread worker holds many connections on a pool of request threads; the parsing and
+# searching itself is bounded by SEARCH_WORKERS and SEARCH_QUEUE in main.py.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+# gunicorn turns sync workers into gthread ones when threads > 1.
+threads = int(os.environ.get("GUNICORN_THREADS", 32 if worker_class == "gthread" else 1))
+
+# Build the recipe index once in the master and let the forked workers share its
+# memory-mapped pages instead of each loading a private copy.
+preload_app = os.environ.get("PRELOAD_APP", "1") == "1"
+
+# RECIPE_SHARDS searches through views of these pages, so it adds no per-worker copy.
+os.environ.setdefault("RECIPE_INDEX_MMAP", "1")
+
 timeout = 120
 
 accesslog = "-"
 
 errorlog = "-"
 
-loglevel = "info"
\ No newline at end of file
+loglevel = "info"
+
+
+def when_ready(server):
+    # Runs in the master before any worker is forked: with preload_app, build the engines
+    # there so that the workers inherit them.
+    if preload_app:
+        from main import warmup
+        warmup()
+
+
+def post_worker_init(worker):
+    # Without preload_app each worker builds its own engines before taking requests.
+    # Threads do not survive the fork from a preloading master, so each worker starts its
+    # own watcher to swap in new recipe indexes and pick up recipe changes.
+    from main import coordinator, get_recipe_engine, warmup
+    warmup()
+    if coordinator is None:
+        get_recipe_engine().start_watcher()
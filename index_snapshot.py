@@ -0,0 +1,298 @@
+import json
+import math
+import os
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
+from recipe_index import RecipeIndex, TextColumn
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock on this platform; one writer process is assumed
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path, shared by all processes, for the duration of the block"""
+    try:
+        lock_file = open(path, 'a')
+    except OSError:
+        yield
+        return
+    with lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def normalize_record(record, base):
+    """Validate a new recipe against the base index's columns and return it as plain JSON values
+
+    Missing text fields are stored as null, missing whole-number fields as 0 and other
+    missing numbers as null.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("A recipe must be an object mapping field names to values")
+    unknown = sorted(set(record) - set(base.columns))
+    if unknown:
+        raise ValueError(f"Unknown recipe fields: {unknown}")
+    name = record.get('recipe_name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("recipe_name must be a non-empty string")
+
+    clean = {}
+    for field, column in base.columns.items():
+        value = record.get(field)
+        if isinstance(value, float) and math.isnan(value):
+            value = None
+        if isinstance(column, TextColumn):
+            clean[field] = None if value is None else str(value)
+            continue
+        if value is None:
+            clean[field] = 0 if column.dtype.kind in 'iu' else None
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number, got {value!r}") from None
+        if column.dtype.kind in 'iu':
+            if not number.is_integer():
+                raise ValueError(f"{field} must be a whole number, got {value!r}")
+            clean[field] = int(number)
+        else:
+            clean[field] = None if math.isnan(number) else number
+    return clean
+
+
+def plain_values(fields):
+    """Return a recipe's fields with numpy scalars as Python values and NaN as None"""
+    plain = {}
+    for field, value in fields.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            value = None
+        plain[field] = value
+    return plain
+
+
+def build_segment(records, ids, base, vectorizer):
+    """Index normalized recipes with the base index's frozen vocabulary and IDF weights
+
+    Terms the base vocabulary lacks are ignored until the catalog is next rebuilt from
+    the dataset, which is what lets a change skip refitting the vectorizer.
+    """
+    import pandas as pd
+    recipes_df = pd.DataFrame({
+        field: pd.Series([record[field] for record in records],
+                         dtype=object if isinstance(column, TextColumn) else column.dtype)
+        for field, column in base.columns.items()
+    })
+    recipe_text = recipes_df['recipe_name'].fillna('') + ' ' + recipes_df['ingredients'].fillna('')
+    ids = np.asarray(ids, dtype=np.int64)
+    return RecipeIndex.build(recipes_df, vectorizer, vectorizer.transform(recipe_text),
+                             vocabulary=base.vocabulary, ids=ids, next_id=int(ids.max()) + 1)
+
+
+class IndexSnapshot:
+    """One consistent state of the catalog: the base index, a delta segment and tombstones
+
+    The delta segment holds recipes added or updated since the base index was built,
+    vectorized against the base vocabulary. deleted marks base rows that were removed or
+    replaced; delta rows are never tombstoned, since the delta is rewritten without them.
+    Rows are numbered through the base and then the delta. A snapshot is never modified:
+    apply() returns a new one, so a search holding a snapshot sees a single state.
+    """
+
+    def __init__(self, base, delta=None, deleted=None, seq=None, vectorizer=None):
+        self.base = base
+        self.delta = delta
+        self.segments = [base] if delta is None else [base, delta]
+        self.deleted = deleted if deleted is not None else np.zeros(len(base), dtype=bool)
+        self.n_deleted = int(np.count_nonzero(self.deleted))
+        self.seq = base.applied_seq if seq is None else seq
+        self.next_id = max(segment.next_id for segment in self.segments)
+        self.vectorizer = vectorizer or base.make_vectorizer()
+        # Search caches are keyed on the version, so every change must produce a new one.
+        self.version = base.version if self.seq == base.applied_seq else f"{base.version}.{self.seq}"
+
+    def __len__(self):
+        return len(self.base) + (len(self.delta) if self.delta is not None else 0)
+
+    @property
+    def n_recipes(self):
+        """Number of live recipes"""
+        return len(self) - self.n_deleted
+
+    @property
+    def alive(self):
+        """Boolean mask of the rows that are not deleted, or None if every row is live"""
+        if not self.n_deleted:
+            return None
+        return np.concatenate([~self.deleted, np.ones(len(self) - len(self.base), dtype=bool)])
+
+    def _locate(self, i):
+        if i < len(self.base):
+            return self.base, i
+        return self.delta, i - len(self.base)
+
+    def recipe_id(self, i):
+        segment, row = self._locate(i)
+        return int(segment.ids[row])
+
+    def record(self, i):
+        segment, row = self._locate(i)
+        return segment.record(row)
+
+    def parsed(self, i):
+        segment, row = self._locate(i)
+        return segment.parsed(row)
+
+    def position(self, recipe_id):
+        """Return the row of a live recipe id, or -1 if there is none"""
+        if self.delta is not None:
+            row = int(self.delta.positions([recipe_id])[0])
+            if row >= 0:
+                return len(self.base) + row
+        row = int(self.base.positions([recipe_id])[0])
+        if row >= 0 and not self.deleted[row]:
+            return row
+        return -1
+
+    def scores(self, query_vector):
+        """Dot product of every row with a dense query vector"""
+        scores = self.base.recipe_vectors @ query_vector
+        if self.delta is None:
+            return scores
+        return np.concatenate([scores, self.delta.recipe_vectors @ query_vector])
+
+    def score_matrix(self, query_vectors):
+        """Sparse rows x queries matrix of dot products with a sparse query matrix"""
+        scores = self.base.recipe_vectors @ query_vectors.T
+        if self.delta is None:
+            return scores
+        return sparse.vstack([scores, self.delta.recipe_vectors @ query_vectors.T], format='csr')
+
+    def score_nonzeros(self, query_vectors):
+        """Upper bound of each query's nonzero scores in score_matrix(): its terms' postings"""
+        df = np.diff(self.base.postings.offsets)
+        counts = sparse.csr_matrix((df[query_vectors.indices], query_vectors.indices, query_vectors.indptr),
+                                   shape=query_vectors.shape)
+        bounds = np.asarray(counts.sum(axis=1)).ravel()
+        if self.delta is not None:
+            bounds += len(self.delta)
+        return np.minimum(bounds, len(self))
+
+    def apply(self, change):
+        """Return the snapshot after one change-log entry
+
+        A change removes the recipe ids in "remove", then adds "records" under "ids";
+        an update does both with the same id. Raises KeyError for an id that is not live.
+        """
+        deleted = self.deleted
+        delta_keep = None
+        if change.get("remove"):
+            deleted = deleted.copy()
+            if self.delta is not None:
+                delta_keep = np.ones(len(self.delta), dtype=bool)
+            for recipe_id in change["remove"]:
+                i = self.position(recipe_id)
+                if i < 0:
+                    raise KeyError(recipe_id)
+                if i < len(self.base):
+                    deleted[i] = True
+                else:
+                    delta_keep[i - len(self.base)] = False
+
+        segments, keeps = [], []
+        if self.delta is not None:
+            segments.append(self.delta)
+            keeps.append(delta_keep)
+        if change.get("records"):
+            segments.append(build_segment(change["records"], change["ids"], self.base, self.vectorizer))
+            keeps.append(None)
+        if len(segments) == 1 and keeps[0] is None:
+            delta = segments[0]
+        elif segments:
+            delta = RecipeIndex.merge(segments, keeps)
+        else:
+            delta = None
+        if delta is not None and not len(delta):
+            delta = None
+        return IndexSnapshot(self.base, delta, deleted, change["seq"], self.vectorizer)
+
+    def compact(self):
+        """Return a new base index with the delta appended and deleted rows dropped"""
+        return RecipeIndex.merge(self.segments, [~self.deleted, None][:len(self.segments)],
+                                 next_id=self.next_id, applied_seq=self.seq)
+
+    def to_dataframe(self):
+        """Return the live recipes as a DataFrame indexed by recipe id"""
+        import pandas as pd
+        frames = []
+        for segment, keep in zip(self.segments, [~self.deleted, None]):
+            df = segment.to_dataframe()
+            df.index = np.asarray(segment.ids)
+            frames.append(df if keep is None else df[keep])
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+
+class ChangeLog:
+    """Append-only JSON-lines log of catalog changes not yet merged into the saved index
+
+    The first line records the dataset hash of the index the changes apply to; each
+    further line is one change with its sequence number. An index saved after a merge
+    records the last sequence number it contains, so replaying the log on top of it
+    skips what it already holds. Writers serialise on a lock file, so engines in several
+    processes (e.g. gunicorn workers) never hand out the same sequence number or id.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    def locked(self):
+        """Hold the writers' lock across processes for the duration of the block"""
+        return file_lock(self.lock_path)
+
+    def stat(self):
+        """Return a value that changes whenever the log is appended to or rewritten"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def read(self):
+        """Return (header, changes), or (None, []) if there is no log"""
+        try:
+            with open(self.path) as f:
+                lines = f.read().split('\n')
+        except FileNotFoundError:
+            return None, []
+        # The last piece is empty after a complete line, or a line still being written.
+        lines = lines[:-1]
+        if not lines:
+            return None, []
+        return json.loads(lines[0]), [json.loads(line) for line in lines[1:]]
+
+    def append(self, change):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(change) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rewrite(self, header, changes):
+        """Replace the log with a header and the given changes, atomically"""
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            for entry in [header, *changes]:
+                f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from array import array
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+from constraint_index import ConstraintIndexBuilder
+from recipe_index import (LIST_PARSERS, MANIFEST_NAME, TEXT_PARTS, RecipeIndex, TextColumn, TextColumnBuilder,
+                          TextListColumnBuilder, dataset_files, dataset_fingerprint, dataset_stat)
+
+TEXT_COLUMNS = ['recipe_name', 'ingredients', 'instructions']
+NUMERIC_COLUMNS = ['cook_time']
+# Columnar datasets are directories of the .npy arrays convert_csv writes, with a manifest.
+COLUMNAR_EXTENSION = ".columns"
+COLUMNAR_FORMAT_VERSION = 2
+
+
+class TfidfBuilder:
+    """Streams documents into term counts and fits TF-IDF exactly like TfidfVectorizer
+
+    Terms get provisional ids in first-seen order and each document's counts are kept in
+    that order, which is the layout CountVectorizer builds before renumbering terms
+    alphabetically, so the final matrix matches fit_transform bit for bit.
+    """
+
+    def __init__(self):
+        self.analyzer = TfidfVectorizer(stop_words='english').build_analyzer()
+        self.vocabulary = {}
+        self.indices = array('i')
+        self.counts = array('i')
+        self.indptr = array('q', [0])
+
+    def add(self, documents):
+        vocabulary = self.vocabulary
+        for document in documents:
+            counts = {}
+            for term in self.analyzer(document):
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            term_ids = sorted(counts)
+            self.indices.extend(term_ids)
+            self.counts.extend(counts[t] for t in term_ids)
+            self.indptr.append(len(self.indices))
+
+    def finish(self):
+        """Return (vectorizer, tf-idf matrix) as TfidfVectorizer.fit_transform would"""
+        if not self.vocabulary:
+            raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+        terms = sorted(self.vocabulary)
+        renumber = np.empty(len(terms), dtype=np.int32)
+        for new_id, term in enumerate(terms):
+            renumber[self.vocabulary[term]] = new_id
+        self.vocabulary = None
+
+        indices = renumber.take(np.frombuffer(self.indices, dtype=np.int32))
+        indptr = np.frombuffer(self.indptr, dtype=np.int64)
+        if indptr[-1] <= np.iinfo(np.int32).max:
+            indptr = indptr.astype(np.int32)
+        counts = sparse.csr_array(
+            (np.frombuffer(self.counts, dtype=np.int32).astype(np.float64), indices, indptr),
+            shape=(len(self.indptr) - 1, len(terms)),
+        )
+        self.indices = self.counts = self.indptr = None
+        # TfidfVectorizer selects all columns when no feature is pruned, which fixes the layout.
+        counts = counts[:, np.arange(len(terms))]
+
+        tfidf = TfidfTransformer()
+        tfidf.fit(counts)
+        vectorizer = TfidfVectorizer(stop_words='english')
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        vectorizer.idf_ = tfidf.idf_
+        return vectorizer, sparse.csr_matrix(tfidf.transform(counts, copy=False))
+
+
+def _finish_numeric(values):
+    """Return a numeric column as int64 when every value is integral, as read_csv would infer"""
+    values = np.frombuffer(values, dtype=np.float64)
+    if np.isfinite(values).all() and (values == np.round(values)).all():
+        return values.astype(np.int64)
+    return values.copy()
+
+
+def _dataset_columns(header):
+    """Return the (text, numeric) columns of a dataset the index uses, checking the required ones"""
+    missing = [name for name in ('recipe_name', 'ingredients') if name not in header]
+    if missing:
+        raise ValueError(f"Dataset is missing required columns: {missing}")
+    return ([name for name in TEXT_COLUMNS if name in header],
+            [name for name in NUMERIC_COLUMNS if name in header])
+
+
+def _read_csv_chunks(dataset_path, text_columns, numeric_columns, chunk_size):
+    """Yield ({text column: values}, {numeric column: float values}) chunk_size rows at a time"""
+    reader = pd.read_csv(dataset_path, usecols=text_columns + numeric_columns, chunksize=chunk_size,
+                         dtype={name: str for name in text_columns + numeric_columns})
+    for chunk in reader:
+        yield ({name: chunk[name].tolist() for name in text_columns},
+               {name: pd.to_numeric(chunk[name], errors='coerce').astype(np.float64).tolist()
+                for name in numeric_columns})
+
+
+def _text(value):
+    return value if isinstance(value, str) else ''
+
+
+class _IndexBuilder:
+    """Tokenizes, splits and indexes recipe text chunk by chunk into the parts of a RecipeIndex"""
+
+    def __init__(self, text_columns, keep_text=True):
+        self.tfidf = TfidfBuilder()
+        self.texts = {name: TextColumnBuilder() for name in text_columns} if keep_text else {}
+        self.lists = {name: TextListColumnBuilder() for name in LIST_PARSERS if name in text_columns}
+        self.constraints = ConstraintIndexBuilder()
+
+    def add(self, texts):
+        self.tfidf.add([_text(name) + ' ' + _text(ingredients)
+                        for name, ingredients in zip(texts['recipe_name'], texts['ingredients'])])
+        for name, values in texts.items():
+            if name in self.texts:
+                self.texts[name].extend(values)
+            if name in self.lists:
+                self.lists[name].extend([LIST_PARSERS[name](value) for value in values])
+        self.constraints.add(texts['ingredients'])
+
+    def finish(self, columns, dataset_path):
+        vectorizer, recipe_vectors = self.tfidf.finish()
+        cook_times = columns.get('cook_time')
+        return RecipeIndex(
+            list(vectorizer.get_feature_names_out()), np.asarray(vectorizer.idf_), recipe_vectors, columns,
+            self.constraints.finish(cook_times), {name: builder.finish() for name, builder in self.lists.items()},
+            dataset_fingerprint(dataset_path), dataset_stat(dataset_path),
+        )
+
+
+def build_index_from_dataset(dataset_path, chunk_size=20000):
+    """Build a RecipeIndex from a recipes CSV or a columnar dataset (.columns), see convert_csv"""
+    if is_columnar(dataset_path):
+        return build_index_from_columnar(dataset_path, chunk_size)
+    return build_index_from_csv(dataset_path, chunk_size)
+
+
+def build_index_from_csv(dataset_path, chunk_size=20000):
+    """Build a RecipeIndex from a recipes CSV without loading the whole file at once
+
+    Only the columns the engine uses are read, chunk_size rows at a time with explicit
+    dtypes. Each chunk is tokenized, encoded into the packed text columns and added to
+    the ingredient index before the next one is read, so the full text is never held
+    in memory twice. Non-numeric cook times become NaN, which results show as 0 minutes.
+    """
+    start = time.perf_counter()
+    header = pd.read_csv(dataset_path, nrows=0).columns
+    text_columns, numeric_columns = _dataset_columns(header)
+
+    builder = _IndexBuilder(text_columns)
+    numbers = {name: array('d') for name in numeric_columns}
+    for texts, numeric in _read_csv_chunks(dataset_path, text_columns, numeric_columns, chunk_size):
+        builder.add(texts)
+        for name, values in numeric.items():
+            numbers[name].extend(values)
+
+    columns = {name: builder.texts[name].finish() for name in text_columns}
+    columns.update({name: _finish_numeric(numbers[name]) for name in numeric_columns})
+    columns = {name: columns[name] for name in header if name in columns}
+    index = builder.finish(columns, dataset_path)
+    print(f"Built recipe index from {dataset_path} in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def is_columnar(dataset_path):
+    return str(dataset_path).rstrip(os.sep).endswith(COLUMNAR_EXTENSION)
+
+
+def dataset_size(dataset_path):
+    """Return the size in bytes of a dataset file or columnar dataset directory"""
+    return sum(os.path.getsize(path) for path in dataset_files(dataset_path))
+
+
+def read_columnar(dataset_path, names=None):
+    """Read the columns of a columnar dataset, or only those in names, as {name: column}
+
+    Text columns come back as packed TextColumns and numeric ones as arrays, in the
+    dataset's column order. Every array is memory-mapped read-only from its .npy file,
+    so nothing is copied until it is used and columns not asked for are not read at all.
+    """
+    with open(os.path.join(dataset_path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != COLUMNAR_FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar dataset format in {dataset_path}")
+    columns = {}
+    for column in manifest["columns"]:
+        if names is not None and column["name"] not in names:
+            continue
+        arrays = [np.load(os.path.join(dataset_path, name), mmap_mode='r') for name in column["files"]]
+        columns[column["name"]] = arrays[0] if column["kind"] == "numeric" else TextColumn(*arrays)
+    return columns
+
+
+def build_index_from_columnar(dataset_path, chunk_size=20000):
+    """Build a RecipeIndex from a columnar dataset written by convert_csv
+
+    The packed text and numeric columns go into the index as they were read; only the
+    text the vectorizer, list parsers and ingredient index need is decoded, chunk_size
+    rows at a time.
+    """
+    start = time.perf_counter()
+    columns = read_columnar(dataset_path, TEXT_COLUMNS + NUMERIC_COLUMNS)
+    text_columns, _ = _dataset_columns(columns)
+    builder = _IndexBuilder(text_columns, keep_text=False)
+    n_rows = len(columns['recipe_name'])
+    for row in range(0, n_rows, chunk_size):
+        stop = min(row + chunk_size, n_rows)
+        builder.add({name: columns[name].tolist(row, stop) for name in text_columns})
+    index = builder.finish(columns, dataset_path)
+    print(f"Built recipe index from {dataset_path} in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def convert_csv(csv_path, columnar_path, chunk_size=20000):
+    """Write the columns of a recipes CSV the index uses to a columnar dataset (.columns)
+
+    Text columns are stored packed (utf-8 bytes, offsets and null flags) and cook_time as
+    int64, or float64 with NaN if some cook times are missing or not whole numbers, the
+    types the CSV would give the index. Each array is a plain .npy file, so that reading
+    it is a memory map rather than a copy, and the directory is replaced atomically as
+    RecipeIndex.save replaces an index.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    text_columns, numeric_columns = _dataset_columns(header)
+    texts = {name: TextColumnBuilder() for name in text_columns}
+    numbers = {name: array('d') for name in numeric_columns}
+    for text, numeric in _read_csv_chunks(csv_path, text_columns, numeric_columns, chunk_size):
+        for name, values in text.items():
+            texts[name].extend(values)
+        for name, values in numeric.items():
+            numbers[name].extend(values)
+
+    tmp_dir = f"{columnar_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    def save_array(name, array):
+        np.save(os.path.join(tmp_dir, name), array)
+        return name
+
+    manifest = {"format_version": COLUMNAR_FORMAT_VERSION, "columns": []}
+    for i, name in enumerate(name for name in header if name in texts or name in numbers):
+        if name in texts:
+            manifest["columns"].append({
+                "name": name,
+                "kind": "text",
+                "files": [save_array(f"col{i}.{part}.npy", a)
+                          for part, a in zip(TEXT_PARTS, texts[name].finish().arrays())],
+            })
+        else:
+            manifest["columns"].append({
+                "name": name,
+                "kind": "numeric",
+                "files": [save_array(f"col{i}.npy", _finish_numeric(numbers[name]))],
+            })
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = f"{columnar_path}.old-{os.getpid()}"
+    if os.path.exists(columnar_path):
+        os.rename(columnar_path, old_dir)
+    os.rename(tmp_dir, columnar_path)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    return columnar_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert a recipes CSV into a columnar dataset (.columns)')
+    parser.add_argument('csv_path')
+    parser.add_argument('columnar_path', nargs='?', help='defaults to the CSV path with a .columns extension')
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    args = parser.parse_args()
+    columnar_path = args.columnar_path or os.path.splitext(args.csv_path)[0] + COLUMNAR_EXTENSION
+    start = time.perf_counter()
+    convert_csv(args.csv_path, columnar_path, args.chunk_size)
+    print(f"Wrote {columnar_path} ({dataset_size(columnar_path) / 2**20:.1f} MiB) "
+          f"in {time.perf_counter() - start:.2f}s")
@@ -1,16 +1,150 @@
 import os
 import argparse
-from recipe_engine import RecipeEngine
-from nlu import SimpleNLU
+import hmac
+import threading
+import time
+from concurrent import futures
+from functools import wraps
+import metrics
+from profiling import PROFILER
+from query_cache import LRUCache
+from scatter_gather import Coordinator, ShardUnavailable
+from serving import BoundedExecutor, MicroBatcher, Overloaded
 
 try:
-    from flask import Flask, request, render_template, jsonify
+    from flask import Flask, Response, g, request, render_template, jsonify
     app = Flask(__name__)
 except ImportError:
     app = None
 
-recipe_engine = RecipeEngine()
-nlu = SimpleNLU()
+parse_cache = LRUCache(int(os.environ.get("PARSE_CACHE_SIZE", 2000)),
+                       float(os.environ.get("PARSE_CACHE_TTL", 300)) or None)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# Parsing and searching run on a few threads whatever the number of request threads, with a
+# bounded queue in front of them; requests beyond it get a 503 instead of waiting.
+search_executor = BoundedExecutor(int(os.environ.get("SEARCH_WORKERS", 2)),
+                                  int(os.environ.get("SEARCH_QUEUE", 16)))
+SEARCH_TIMEOUT = float(os.environ.get("SEARCH_TIMEOUT", 10))
+# The most recipes a query can ask for on /search/batch and /shard/search.
+SEARCH_MAX_TOP_N = int(os.environ.get("SEARCH_MAX_TOP_N", 100))
+# With SEARCH_BATCH_WINDOW_MS set, /search requests arriving within that window (up to
+# SEARCH_BATCH_SIZE of them) are parsed and searched together instead; 0 batches only the
+# requests that queued up while the previous batch ran.
+SEARCH_BATCH_WINDOW_MS = os.environ.get("SEARCH_BATCH_WINDOW_MS")
+# With SEARCH_SHARDS set to shard server URLs (servers run with RECIPE_SHARD=i/n), this is
+# a coordinator: searches are parsed here and fanned out to the shards, and no index is loaded.
+coordinator = Coordinator.from_env()
+
+# The engines are built on first use rather than at import, so that importing this module
+# (for --help, or a CLI session that ends at once) does not load the index or spaCy.
+_recipe_engine = None
+_nlu = None
+_engine_lock = threading.Lock()
+_nlu_lock = threading.Lock()
+
+def get_recipe_engine():
+    """Return this process's RecipeEngine, building it on first use"""
+    global _recipe_engine
+    if _recipe_engine is None:
+        with _engine_lock:
+            if _recipe_engine is None:
+                from recipe_engine import RecipeEngine
+                _recipe_engine = RecipeEngine()
+    return _recipe_engine
+
+def get_nlu():
+    """Return this process's SimpleNLU, building it on first use"""
+    global _nlu
+    if _nlu is None:
+        with _nlu_lock:
+            if _nlu is None:
+                from nlu import SimpleNLU
+                _nlu = SimpleNLU()
+    return _nlu
+
+def warmup():
+    """Build the engines and answer one query, so that the first request does not wait for them
+
+    Servers call this before taking traffic; it loads the index, the scikit-learn
+    vectorizer and, in lazy NLU mode, the spaCy pipeline. A coordinator only parses.
+    """
+    parse_query("recipe for chicken curry")
+    if coordinator is None:
+        get_recipe_engine().search_recipes("chicken curry", {})
+
+def __getattr__(name):
+    # main.recipe_engine and main.nlu, for code written when these were module globals.
+    if name == "recipe_engine":
+        return get_recipe_engine()
+    if name == "nlu":
+        return get_nlu()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def parse_version(recipe_engine=None):
+    # Parses are cached per index version; a coordinator has no index to follow.
+    if coordinator is not None:
+        return None
+    return (recipe_engine or get_recipe_engine()).index_version
+
+def parse_query(text, nlu=None, recipe_engine=None):
+    """Parse raw user text into (parsed_data, search_query, constraints), reusing cached parses
+
+    nlu and recipe_engine default to this process's own, built on first use.
+    """
+    nlu = nlu or get_nlu()
+    version = parse_version(recipe_engine)
+    parsed = parse_cache.get(text, version)
+    if parsed is None:
+        with metrics.span("parse"):
+            parsed_data = nlu.parse(text)
+        with metrics.span("extract"):
+            search_query, constraints = nlu.extract_query_info(parsed_data)
+        parsed = (parsed_data, search_query, constraints)
+        parse_cache.put(text, parsed, version)
+    return parsed
+
+def parse_queries(texts):
+    """parse_query for several texts, parsing the ones not cached in one batch"""
+    nlu = get_nlu()
+    version = parse_version()
+    parsed = [parse_cache.get(text, version) for text in texts]
+    missing = [i for i, cached in enumerate(parsed) if cached is None]
+    if missing:
+        with metrics.span("parse"):
+            parsed_many = nlu.parse_many([texts[i] for i in missing])
+        with metrics.span("extract"):
+            for i, parsed_data in zip(missing, parsed_many):
+                search_query, constraints = nlu.extract_query_info(parsed_data)
+                parsed[i] = (parsed_data, search_query, constraints)
+                parse_cache.put(texts[i], parsed[i], version)
+    return parsed
+
+def run_search(submit, *args):
+    """Submit search work with submit(*args) and return its result as JSON, or a 503 when overloaded
+
+    The work returns (result, stage timings), as metrics.traced() functions do; requests
+    with an "X-Timing: 1" header get the timings back in a Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        future = submit(*args)
+    except Overloaded:
+        return jsonify({'error': 'Server is busy, please retry'}), 503, {'Retry-After': '1'}
+    try:
+        result, trace = future.result(timeout=SEARCH_TIMEOUT)
+    except futures.TimeoutError:
+        future.cancel()
+        return jsonify({'error': 'Search timed out, please retry'}), 503, {'Retry-After': '1'}
+    except ShardUnavailable:
+        return jsonify({'error': 'No search shard is available, please retry'}), 503, {'Retry-After': '1'}
+    serialize_start = time.perf_counter()
+    response = jsonify(result)
+    trace["serialize"] = time.perf_counter() - serialize_start
+    metrics.record("serialize", trace["serialize"])
+    if request.headers.get('X-Timing') == '1':
+        trace["total"] = time.perf_counter() - start
+        response.headers['Server-Timing'] = metrics.server_timing(trace)
+    return response
 
 @app.route('/', methods=['GET'])
 def index():
@@ -378,69 +512,364 @@ def index():
 @app.route('/search', methods=['GET'])
 def search():
     query = request.args.get('query', '')
-    
-    parsed_data = nlu.parse(query)
-    search_query, constraints = nlu.extract_query_info(parsed_data)
+    if search_batcher is not None:
+        return run_search(search_batcher.submit, (query, time.perf_counter()))
+    return run_search(search_executor.submit, metrics.traced(PROFILER.call), search_results, query)
+
+def search_results(query):
+    if coordinator is not None:
+        return coordinator_results(query)
+    recipe_engine = get_recipe_engine()
+    parsed_data, search_query, constraints = parse_query(query)
     
     recipes = recipe_engine.search_recipes(search_query, constraints)
     
-    result = {
-        'recipes': []
-    }
-    
-    for recipe in recipes:
-        ingredients = []
-        if isinstance(recipe['ingredients'], str):
-            if recipe['ingredients'].startswith('[') and recipe['ingredients'].endswith(']'):
-                try:
-                    ingredients_str = recipe['ingredients'][1:-1]
-                    import re
-                    ingredients = re.findall(r'\'([^\']+)\'|\"([^\"]+)\"', ingredients_str)
-                    ingredients = [i[0] if i[0] else i[1] for i in ingredients]
-                except:
-                    ingredients = [item.strip() for item in recipe['ingredients'].split(',')]
-            else:
-                ingredients = [item.strip() for item in recipe['ingredients'].split(',')]
-        elif isinstance(recipe['ingredients'], list):
-            ingredients = recipe['ingredients']
-        
-        instructions = []
-        if isinstance(recipe['instructions'], str):
-            if recipe['instructions'].startswith('[') and recipe['instructions'].endswith(']'):
-                try:
-                    instructions_str = recipe['instructions'][1:-1]
-                    import re
-                    instructions = re.findall(r'\'([^\']+)\'|\"([^\"]+)\"', instructions_str)
-                    instructions = [i[0] if i[0] else i[1] for i in instructions]
-                except:
-                    raw_instructions = recipe['instructions'].replace('. ', '.|').split('|')
-                    instructions = [instr.strip() for instr in raw_instructions if instr.strip()]
-            elif '. ' in recipe['instructions']:
-                raw_instructions = recipe['instructions'].replace('. ', '.|').split('|')
-                instructions = [instr.strip() for instr in raw_instructions if instr.strip()]
-            elif '\n' in recipe['instructions']:
-                raw_instructions = recipe['instructions'].split('\n')
-                instructions = [instr.strip() for instr in raw_instructions if instr.strip()]
-            else:
-                instructions = [recipe['instructions'].strip()]
-        elif isinstance(recipe['instructions'], list):
-            instructions = recipe['instructions']
-        
-        cook_time = int(recipe['cook_time']) if 'cook_time' in recipe else 0
-        
-        recipe_data = {
-            'name': recipe['recipe_name'],
-            'cook_time': cook_time,
-            'ingredients': ingredients,
-            'instructions': instructions
+    with metrics.span("format"):
+        return {
+            'recipes': [recipe_engine.recipe_summary(recipe) for recipe in recipes]
         }
-        
-        result['recipes'].append(recipe_data)
+
+def coordinator_results(query, top_n=3):
+    """search_results from the shard servers; partial results say how many shards are missing"""
+    parsed_data, search_query, constraints = parse_query(query)
+    recipes, failed = coordinator.search(search_query, constraints, top_n)
+    result = {'recipes': recipes}
+    if failed:
+        result.update(partial=True, missing_shards=len(failed))
+    return result
+
+def search_results_many(queries):
+    """search_results for several queries, parsed in one batch and scored with one search_many"""
+    if coordinator is not None:
+        return [coordinator_results(query) for query in queries]
+    recipe_engine = get_recipe_engine()
+    if len(queries) == 1:
+        # A lone query is cheaper on the dense single-query path than as a 1-column product.
+        return [search_results(queries[0])]
+    parsed = parse_queries(queries)
+    results = recipe_engine.search_many([search_query for _, search_query, _ in parsed],
+                                        [constraints for _, _, constraints in parsed])
+    with metrics.span("format"):
+        return [
+            {'recipes': [recipe_engine.recipe_summary(recipe) for recipe in recipes]}
+            for recipes in results
+        ]
+
+def search_batched_requests(items):
+    """Process a micro-batch of (query, submit time) items into (result, stage timings) pairs
+
+    Every request of a batch reports the stage timings of the whole batch, plus the time
+    it waited for the batch to start as its "queue" stage.
+    """
+    start = time.perf_counter()
+    for _, submitted in items:
+        metrics.record("queue", start - submitted)
+    results, trace = metrics.traced(PROFILER.call, queued=False)(search_results_many,
+                                                                 [query for query, _ in items])
+    return [(result, {"queue": start - submitted, **trace})
+            for result, (_, submitted) in zip(results, items)]
+
+search_batcher = None
+if SEARCH_BATCH_WINDOW_MS:
+    search_batcher = MicroBatcher(search_batched_requests, float(SEARCH_BATCH_WINDOW_MS) / 1000,
+                                  int(os.environ.get("SEARCH_BATCH_SIZE", 32)),
+                                  int(os.environ.get("SEARCH_BATCH_QUEUE", 256)))
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    queries = request.get_json(silent=True)
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return jsonify({'error': 'Expected a JSON array of query strings'}), 400
+    if len(queries) > int(os.environ.get("SEARCH_BATCH_MAX", 10000)):
+        return jsonify({'error': 'Too many queries in one batch'}), 413
+    try:
+        top_n = int(request.args.get('top_n', 3))
+    except ValueError:
+        top_n = -1
+    if not 0 <= top_n <= SEARCH_MAX_TOP_N:
+        return jsonify({'error': f'top_n must be an integer from 0 to {SEARCH_MAX_TOP_N}'}), 400
+    return run_search(search_executor.submit, metrics.traced(search_batch_results), queries, top_n)
+
+def search_batch_results(queries, top_n):
+    if coordinator is not None:
+        return {'results': [{'query': query, **coordinator_results(query, top_n)} for query in queries]}
+    recipe_engine = get_recipe_engine()
+    search_queries = []
+    constraints_list = []
+    for _, search_query, constraints in parse_queries(queries):
+        search_queries.append(search_query)
+        constraints_list.append(constraints)
+    
+    results = recipe_engine.search_many(search_queries, constraints_list, top_n)
     
-    return jsonify(result)
+    with metrics.span("format"):
+        return {
+            'results': [
+                {
+                    'query': query,
+                    'recipes': [recipe_engine.recipe_summary(recipe) for recipe in recipes]
+                }
+                for query, recipes in zip(queries, results)
+            ]
+        }
+
+def local_index_required(view):
+    """Refuse the view on a coordinator, which has no index of its own"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if coordinator is not None:
+            return jsonify({'error': 'This server coordinates shard servers; send this to each of them'}), 409
+        return view(*args, **kwargs)
+    return wrapper
+
+def constraints_error(constraints):
+    """Return what is wrong with a constraints object from a request, or None if it is valid"""
+    if not isinstance(constraints, dict):
+        return 'constraints must be an object'
+    for name in ('include_ingredients', 'exclude_ingredients'):
+        value = constraints.get(name, [])
+        if not isinstance(value, str) and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            return f'{name} must be a string or a list of strings'
+    max_time = constraints.get('max_time', 0)
+    if isinstance(max_time, bool) or not isinstance(max_time, (int, float)):
+        return 'max_time must be a number'
+    return None
+
+@app.route('/shard/search', methods=['POST'])
+@local_index_required
+def shard_search():
+    """Search RPC of a shard server: {"query", "constraints", "top_n"} of a parsed query in,
+    this shard's top recipes with their scores and catalog rows out (see Coordinator)"""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('query'), str):
+        return jsonify({'error': 'Expected a JSON object with a query string and a constraints object'}), 400
+    error = constraints_error(body.get('constraints', {}))
+    if error is not None:
+        return jsonify({'error': error}), 400
+    top_n = body.get('top_n', 3)
+    if not isinstance(top_n, int) or not 0 <= top_n <= SEARCH_MAX_TOP_N:
+        return jsonify({'error': f'top_n must be an integer from 0 to {SEARCH_MAX_TOP_N}'}), 400
+    return run_search(search_executor.submit, metrics.traced(PROFILER.call), shard_search_results,
+                      body['query'], body.get('constraints') or {}, top_n)
+
+def shard_search_results(query, constraints, top_n):
+    recipe_engine = get_recipe_engine()
+    matched, found = recipe_engine.search_partition(query, constraints, top_n)
+    with metrics.span("format"):
+        return {
+            'matched': matched,
+            'index_version': recipe_engine.index_version,
+            'recipes': [{'row': row, 'score': recipe.match_score, 'recipe': recipe_engine.recipe_summary(recipe)}
+                        for row, recipe in found]
+        }
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    if coordinator is not None:
+        return jsonify({
+            'coordinator': coordinator.stats(),
+            'parses': parse_cache.stats(),
+            'search_executor': search_executor.stats(),
+            'search_batcher': search_batcher.stats() if search_batcher is not None else None
+        })
+    recipe_engine = get_recipe_engine()
+    return jsonify({
+        'index_version': recipe_engine.index_version,
+        'results': recipe_engine.result_cache.stats(),
+        'parses': parse_cache.stats(),
+        'search_executor': search_executor.stats(),
+        'search_batcher': search_batcher.stats() if search_batcher is not None else None
+    })
+
+HTTP_REQUESTS = metrics.REGISTRY.register(metrics.Counter(
+    "recipe_http_requests_total", "HTTP requests answered, by route, method and status",
+    ("route", "method", "status")))
+HTTP_REQUEST_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    "recipe_http_request_seconds", "Time to answer HTTP requests, by route", labelnames=("route",)))
+
+def cache_samples(field):
+    def collect():
+        samples = {("parses",): parse_cache.stats()[field]}
+        if _recipe_engine is not None:
+            samples[("results",)] = _recipe_engine.result_cache.stats()[field]
+        return samples
+    return collect
+
+for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        f"recipe_cache_{field}" + ("_total" if kind == "counter" else ""),
+        f"Result and parse cache {field}", cache_samples(field), ("cache",), kind))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "recipe_search_pending", "Searches running or queued in the search executor",
+    lambda: {(): search_executor.stats()["pending"]}))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "recipe_search_rejected_total", "Searches refused with a 503 because the server was at capacity",
+    lambda: {(): search_executor.stats()["rejected"]
+             + (search_batcher.stats()["rejected"] if search_batcher is not None else 0)},
+    kind="counter"))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "recipe_search_batches_total", "Micro-batches of /search requests processed",
+    lambda: {(): search_batcher.stats()["batches"] if search_batcher is not None else 0}, kind="counter"))
+
+def index_samples():
+    if _recipe_engine is None:
+        return {}
+    stats = _recipe_engine.index_stats()
+    return {("base",): stats["base_recipes"], ("delta",): stats["delta_recipes"],
+            ("deleted",): stats["deleted"]}
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "recipe_index_recipes", "Rows of the index: base and delta segments, and deleted recipes",
+    index_samples, ("segment",)))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_REQUESTS.inc(1, route, request.method, str(response.status_code))
+    if 'request_start' in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, route)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metrics of this worker process in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
-def run_cli_interface(recipe_engine, nlu):
-    """Run command-line interface for the recipe generator"""
+def admin_required(view):
+    """Serve the view only to requests carrying ADMIN_TOKEN in an X-Admin-Token header"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Admin API is disabled; set ADMIN_TOKEN to enable it'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            return jsonify({'error': 'Invalid admin token'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/admin/recipes', methods=['POST'])
+@admin_required
+@local_index_required
+def admin_add_recipes():
+    recipe_engine = get_recipe_engine()
+    recipes = request.get_json(silent=True)
+    if isinstance(recipes, dict):
+        recipes = [recipes]
+    if not isinstance(recipes, list) or not recipes:
+        return jsonify({'error': 'Expected a JSON recipe object or an array of them'}), 400
+    try:
+        ids = recipe_engine.add_recipes(recipes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'ids': ids, 'index_version': recipe_engine.index_version}), 201
+
+@app.route('/admin/recipes/<int:recipe_id>', methods=['GET'])
+@admin_required
+@local_index_required
+def admin_get_recipe(recipe_id):
+    try:
+        return jsonify(get_recipe_engine().get_recipe(recipe_id))
+    except KeyError:
+        return jsonify({'error': f'No recipe with id {recipe_id}'}), 404
+
+@app.route('/admin/recipes/<int:recipe_id>', methods=['PUT'])
+@admin_required
+@local_index_required
+def admin_update_recipe(recipe_id):
+    recipe_engine = get_recipe_engine()
+    fields = request.get_json(silent=True)
+    if not isinstance(fields, dict):
+        return jsonify({'error': 'Expected a JSON object of recipe fields'}), 400
+    try:
+        recipe_engine.update_recipe(recipe_id, fields)
+    except KeyError:
+        return jsonify({'error': f'No recipe with id {recipe_id}'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'id': recipe_id, 'index_version': recipe_engine.index_version})
+
+@app.route('/admin/recipes/<int:recipe_id>', methods=['DELETE'])
+@admin_required
+@local_index_required
+def admin_remove_recipe(recipe_id):
+    return admin_remove([recipe_id])
+
+@app.route('/admin/recipes', methods=['DELETE'])
+@admin_required
+@local_index_required
+def admin_remove_recipes():
+    recipe_ids = request.get_json(silent=True)
+    if not isinstance(recipe_ids, list) or not all(isinstance(i, int) for i in recipe_ids):
+        return jsonify({'error': 'Expected a JSON array of recipe ids'}), 400
+    return admin_remove(recipe_ids)
+
+def admin_remove(recipe_ids):
+    recipe_engine = get_recipe_engine()
+    try:
+        removed = recipe_engine.remove_recipes(recipe_ids)
+    except KeyError as e:
+        return jsonify({'error': f'No recipe with id {e.args[0]}'}), 404
+    return jsonify({'removed': removed, 'index_version': recipe_engine.index_version})
+
+@app.route('/admin/index', methods=['GET'])
+@admin_required
+@local_index_required
+def admin_index_stats():
+    return jsonify(get_recipe_engine().index_stats())
+
+@app.route('/admin/index/reload', methods=['POST'])
+@admin_required
+@local_index_required
+def admin_reload():
+    recipe_engine = get_recipe_engine()
+    recipe_engine.refresh(wait=False)
+    return jsonify(recipe_engine.index_stats()), 202
+
+@app.route('/admin/index/merge', methods=['POST'])
+@admin_required
+@local_index_required
+def admin_merge():
+    recipe_engine = get_recipe_engine()
+    recipe_engine.merge_segments(wait=False)
+    return jsonify(recipe_engine.index_stats()), 202
+
+@app.route('/admin/profile', methods=['GET'])
+@admin_required
+def admin_profile_stats():
+    return jsonify(PROFILER.stats())
+
+@app.route('/admin/profile', methods=['POST'])
+@admin_required
+def admin_profile():
+    """Set {"sample_every": N} to profile one in N searches (0 stops) and {"allocations": bool}"""
+    settings = request.get_json(silent=True)
+    if not isinstance(settings, dict):
+        return jsonify({'error': 'Expected a JSON object of profiling settings'}), 400
+    sample_every = settings.get('sample_every')
+    if sample_every is not None and (not isinstance(sample_every, int) or isinstance(sample_every, bool)):
+        return jsonify({'error': 'sample_every must be an integer'}), 400
+    try:
+        PROFILER.configure(sample_every, settings.get('allocations'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(PROFILER.stats())
+
+@app.route('/admin/profile/dump', methods=['POST'])
+@admin_required
+def admin_profile_dump():
+    paths = PROFILER.dump()
+    if request.args.get('reset') == '1':
+        PROFILER.reset()
+    return jsonify({'written': paths, **PROFILER.stats()})
+
+def run_cli_interface(recipe_engine=None, nlu=None):
+    """Run command-line interface for the recipe generator
+
+    The engines are built on the first query unless passed in (or warmed up meanwhile).
+    """
     print("\n" + "="*60)
     print("🍳 AI Recipe Generator 🍳".center(60))
     print("="*60)
@@ -458,8 +887,9 @@ def run_cli_interface(recipe_engine, nlu):
             print("Thank you for using AI Recipe Generator. Goodbye!")
             break
         
-        parsed_data = nlu.parse(user_input)
-        query, constraints = nlu.extract_query_info(parsed_data)
+        parsed_data, query, constraints = parse_query(user_input, nlu, recipe_engine)
+        if recipe_engine is None:
+            recipe_engine = get_recipe_engine()
         
         print("\n🔍 Understanding your request...")
         if parsed_data["intent"] == "request_recipe":
@@ -491,21 +921,27 @@ def run_cli_interface(recipe_engine, nlu):
 def main():
     parser = argparse.ArgumentParser(description='AI Recipe Generator')
     parser.add_argument('--web', action='store_true', help='Run with web interface')
+    parser.add_argument('--port', type=int, default=5000, help='Port of the web interface')
     args = parser.parse_args()
     
     if args.web and app is not None:
         print("\n" + "="*60)
         print("🍳 AI Recipe Generator Web Interface 🍳".center(60))
         print("="*60)
-        print("Starting web server. Open http://127.0.0.1:5000 in your browser.")
+        print(f"Starting web server. Open http://127.0.0.1:{args.port} in your browser.")
         print("Press CTRL+C to stop the server.")
         print("="*60 + "\n")
-        app.run(debug=True)
+        warmup()
+        if coordinator is None:
+            get_recipe_engine().start_watcher()
+        app.run(port=args.port, debug=True)
     else:
         if args.web and app is None:
             print("Flask is not installed. Running command-line interface instead.")
             print("To use the web interface, install Flask with: pip install flask")
-        run_cli_interface(recipe_engine, nlu)
+        # Load the engines while the user types their first request.
+        threading.Thread(target=warmup, name="warmup", daemon=True).start()
+        run_cli_interface()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
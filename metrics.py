@@ -0,0 +1,182 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds in seconds of the latency histogram buckets.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 10.0)
+RESULT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels, e.g. Counter("x_total", "...", ("stage",)).inc(1, "parse")"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if not self.labelnames and not values:
+            values[()] = 0
+        for labelvalues, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, as Prometheus expects"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labelvalues, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class CallbackMetric:
+    """Values read when metrics are rendered: collect() returns {labelvalues tuple: value}
+
+    For state kept elsewhere, such as cache statistics; kind is "gauge" or, for values
+    that only grow, "counter".
+    """
+
+    def __init__(self, name, help, collect, labelnames=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.labelnames = labelnames
+        self.kind = kind
+
+    def samples(self):
+        for labelvalues, value in sorted(self.collect().items()):
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "recipe_search_stage_seconds", "Time spent in each stage of answering searches", labelnames=("stage",)))
+QUERIES = REGISTRY.register(Counter(
+    "recipe_search_queries_total", "Queries searched by the engine, result cache hits included"))
+EMPTY_FILTER_FALLBACKS = REGISTRY.register(Counter(
+    "recipe_search_empty_filter_fallbacks_total",
+    "Searches whose constraints no recipe met, answered from all recipes instead"))
+RESULT_COUNTS = REGISTRY.register(Histogram(
+    "recipe_search_results", "Recipes returned per query", RESULT_COUNT_BUCKETS))
+
+_local = threading.local()
+
+
+def record(stage, seconds):
+    """Add the time of one stage to its histogram and to the trace running on this thread"""
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace[stage] = trace.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage):
+    """Time the block as one occurrence of stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def traced(fn, queued=True):
+    """Wrap fn to return (result, {stage: seconds} of the spans it ran on its thread)
+
+    With queued set, wrap at submit time: the time until fn starts is recorded as the
+    "queue" stage.
+    """
+    submitted = time.perf_counter()
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        trace = _local.trace = {}
+        if queued:
+            record("queue", time.perf_counter() - submitted)
+        try:
+            return fn(*args, **kwargs), trace
+        finally:
+            _local.trace = None
+    return run
+
+
+def server_timing(trace):
+    """Format stage timings as a Server-Timing header value, in milliseconds"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in trace.items())
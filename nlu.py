@@ -1,17 +1,50 @@
-import spacy
+import os
 import re
+import threading
 from collections import defaultdict
 
+NLU_MODES = ("eager", "lazy", "regex")
+
+# Everything but the entity recognizer, which is the only component parse() reads.
+NER_ONLY_EXCLUDE = ["tok2vec", "tagger", "morphologizer", "parser", "senter",
+                    "attribute_ruler", "lemmatizer", "sentencizer"]
+
+# Literals at least one of which must occur in the lower-cased text for a pattern to
+# match. They are found in a single scan, and only patterns with a keyword present run.
+PATTERN_KEYWORDS = {
+    r'recipe for ([\w\s]+)': ("recipe for",),
+    r'how (to|do I) (make|cook) ([\w\s]+)': ("how ",),
+    r'show me ([\w\s]+) recipes': ("show me ",),
+    r'I want to (make|cook|prepare) ([\w\s]+)': ("i want to ",),
+    r'(quick|fast|easy|simple)': ("quick", "fast", "easy", "simple"),
+    r'(\d+) minutes?': (" minute",),
+    r'under (\d+) minutes?': ("under ",),
+    r'no ([\w\s]+)': ("no ",),
+    r'without ([\w\s]+)': ("without ",),
+    r"don'?t (have|want|like) ([\w\s]+)": ("don",),
+    r'with ([\w\s]+)': ("with ",),
+    r'using ([\w\s]+)': ("using ",),
+    r'has ([\w\s]+)': ("has ",),
+}
+
 class SimpleNLU:
-    def __init__(self):
-        """Initialize a simple NLU component using spaCy"""
-        try:
-            self.nlp = spacy.load("en_core_web_md")
-        except OSError:
-            print("Downloading spaCy model...")
-            import subprocess
-            subprocess.run(["python", "-m", "spacy", "download", "en_core_web_md"])
-            self.nlp = spacy.load("en_core_web_md")
+    def __init__(self, mode=None, model_name=None):
+        """Initialize a simple NLU component using spaCy
+
+        mode (or NLU_MODE) is "eager" to load the full spaCy model now, "lazy" to load an
+        NER-only pipeline on the first parse, or "regex" to use the patterns alone and
+        never import spaCy.
+        """
+        self.mode = mode or os.environ.get("NLU_MODE", "eager")
+        if self.mode not in NLU_MODES:
+            raise ValueError(f"mode must be one of {NLU_MODES}, got {self.mode!r}")
+        self.model_name = model_name or os.environ.get("NLU_SPACY_MODEL", "en_core_web_md")
+        self._nlp = None
+        self._nlp_lock = threading.Lock()
+        # spaCy does not promise that a pipeline can process texts from several threads at once.
+        self._pipe_lock = threading.Lock()
+        if self.mode == "eager":
+            self._nlp = self._load_model()
         
         self.patterns = {
             'request_recipe': [
@@ -36,35 +69,105 @@ class SimpleNLU:
                 r'has ([\w\s]+)'
             ]
         }
+        self._compile_patterns()
+    
+    def _compile_patterns(self):
+        """Compile self.patterns and the keyword scanner that decides which of them to run"""
+        self._compiled = {
+            category: [(re.compile(pattern, re.IGNORECASE), PATTERN_KEYWORDS.get(pattern))
+                       for pattern in patterns]
+            for category, patterns in self.patterns.items()
+        }
+        keywords = sorted({k for ks in PATTERN_KEYWORDS.values() for k in ks}, key=len, reverse=True)
+        # A lookahead reports keywords at every position, so overlapping ones are all found.
+        self._keyword_scanner = re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))')
+    
+    def _matches(self, category, text, present):
+        """Yield the match of each pattern of a category, in order, skipping ones that cannot match"""
+        for pattern, keywords in self._compiled[category]:
+            if present is not None and keywords is not None and present.isdisjoint(keywords):
+                continue
+            yield pattern.search(text)
+    
+    @property
+    def nlp(self):
+        """The spaCy pipeline, loaded on first use in lazy mode and None in regex mode"""
+        if self._nlp is None and self.mode == "lazy":
+            with self._nlp_lock:
+                if self._nlp is None:
+                    self._nlp = self._load_model(exclude=NER_ONLY_EXCLUDE)
+        return self._nlp
+    
+    def _load_model(self, exclude=()):
+        """Load the spaCy model, downloading it first if it is not installed"""
+        import spacy
+        try:
+            return spacy.load(self.model_name, exclude=exclude)
+        except OSError:
+            print("Downloading spaCy model...")
+            import subprocess
+            subprocess.run(["python", "-m", "spacy", "download", self.model_name])
+            return spacy.load(self.model_name, exclude=exclude)
     
     def parse(self, text):
         """Parse user input to extract intents and entities"""
         text = text.lower()
-        doc = self.nlp(text)
+        nlp = self.nlp
+        doc = None
+        if nlp is not None:
+            with self._pipe_lock:
+                doc = nlp(text)
+        return self._interpret(text, doc)
+    
+    def parse_many(self, texts, batch_size=64, n_process=1):
+        """Parse several texts, streaming them through the spaCy pipeline with nlp.pipe
+
+        Returns the same dicts as calling parse() on each text. Pipeline components that
+        parse() does not read are disabled for the run. n_process > 1 (or -1 for one per
+        CPU) spreads the work over that many worker processes, batch_size texts at a time;
+        starting them costs far more than a request's worth of parsing, so it is meant for
+        large offline jobs.
+        """
+        texts = [text.lower() for text in texts]
+        if n_process == -1:
+            n_process = os.cpu_count() or 1
+        nlp = self.nlp
+        if nlp is None:
+            if n_process > 1 and len(texts) > batch_size:
+                return self._parse_in_pool(texts, batch_size, n_process)
+            return [self._interpret(text, None) for text in texts]
+        disable = [name for name in nlp.pipe_names if name in NER_ONLY_EXCLUDE]
+        with self._pipe_lock:
+            docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable)
+            return [self._interpret(text, doc) for text, doc in zip(texts, docs)]
+    
+    def _parse_in_pool(self, texts, batch_size, n_process):
+        """Apply the patterns to lower-cased texts in a pool of n_process worker processes"""
+        import multiprocessing
+        chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        with multiprocessing.Pool(n_process, initializer=_init_parse_worker, initargs=(self.patterns,)) as pool:
+            return [parsed for chunk in pool.imap(_parse_chunk, chunks) for parsed in chunk]
+    
+    def _interpret(self, text, doc):
+        """Build the parse result for lower-cased text from the patterns and, if any, its spaCy doc"""
+        # Keywords are ASCII and compared case-sensitively, which only agrees with the
+        # IGNORECASE patterns on ASCII text; anything else runs every pattern.
+        present = {m.group(1) for m in self._keyword_scanner.finditer(text)} if text.isascii() else None
         
         intent = "unknown"
+        entities = []
         
-        for pattern in self.patterns['request_recipe']:
-            matches = re.search(pattern, text, re.IGNORECASE)
+        for matches in self._matches('request_recipe', text, present):
             if matches:
                 intent = "request_recipe"
-                break
-        
-        entities = []
-        
-        dish = None
-        for pattern in self.patterns['request_recipe']:
-            matches = re.search(pattern, text, re.IGNORECASE)
-            if matches and len(matches.groups()) > 0:
-                dish = matches.groups()[-1].strip()
-                entities.append({
-                    "entity": "dish",
-                    "value": dish
-                })
-                break
+                if len(matches.groups()) > 0:
+                    entities.append({
+                        "entity": "dish",
+                        "value": matches.groups()[-1].strip()
+                    })
+                    break
         
-        for pattern in self.patterns['time_constraint']:
-            matches = re.search(pattern, text, re.IGNORECASE)
+        for matches in self._matches('time_constraint', text, present):
             if matches:
                 value = matches.group(1)
                 if value.isdigit():
@@ -78,8 +181,7 @@ class SimpleNLU:
                         "value": value
                     })
         
-        for pattern in self.patterns['exclude_ingredient']:
-            matches = re.search(pattern, text, re.IGNORECASE)
+        for matches in self._matches('exclude_ingredient', text, present):
             if matches and len(matches.groups()) > 0:
                 ingredient = matches.groups()[-1].strip()
                 entities.append({
@@ -87,8 +189,7 @@ class SimpleNLU:
                     "value": ingredient
                 })
         
-        for pattern in self.patterns['include_ingredient']:
-            matches = re.search(pattern, text, re.IGNORECASE)
+        for matches in self._matches('include_ingredient', text, present):
             if matches:
                 ingredient = matches.group(1).strip()
                 entities.append({
@@ -96,7 +197,7 @@ class SimpleNLU:
                     "value": ingredient
                 })
         
-        for ent in doc.ents:
+        for ent in doc.ents if doc is not None else ():
             if ent.label_ == "FOOD":
                 if not any(e["entity"] == "include_ingredient" and e["value"] == ent.text for e in entities):
                     entities.append({
@@ -137,4 +238,16 @@ class SimpleNLU:
             if isinstance(value, list) and len(value) == 1:
                 constraints[key] = value[0]
         
-        return query, dict(constraints)
\ No newline at end of file
+        return query, dict(constraints)
+
+# The regex-only SimpleNLU of a parse_many() worker process.
+_worker_nlu = None
+
+def _init_parse_worker(patterns):
+    global _worker_nlu
+    _worker_nlu = SimpleNLU(mode="regex")
+    _worker_nlu.patterns = patterns
+    _worker_nlu._compile_patterns()
+
+def _parse_chunk(texts):
+    return [_worker_nlu._interpret(text, None) for text in texts]
@@ -0,0 +1,143 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Functions listed in the text reports of search profiles and lines in allocation reports.
+REPORT_LINES = 40
+
+
+class Profiler:
+    """Opt-in cProfile sampling of requests and tracemalloc reports of index loading
+
+    With sample_every set to N, call() profiles every N-th call it makes with cProfile and
+    adds the result to per-process aggregated stats; dump() writes them to directory as
+    search-<pid>.pstats (for pstats or snakeviz) and search-<pid>.txt (top functions by
+    cumulative time), which happens on its own every dump_every samples. One call is
+    profiled at a time: a sampled call that starts while another is profiled runs
+    unprofiled. With allocations set, allocations() blocks write the memory they allocated,
+    by line, to alloc-<stage>-<pid>-<time>.txt. Both can be switched at runtime; when off,
+    call() costs one attribute test and allocations() enters a no-op context.
+    """
+
+    def __init__(self, directory="profiles", sample_every=0, allocations=False, dump_every=50):
+        self.directory = directory
+        self.sample_every = sample_every
+        self.allocations_enabled = allocations
+        self.dump_every = dump_every
+        self.sampled = 0
+        self._calls = itertools.count()
+        self._stats = None
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """A Profiler set up from PROFILE_DIR, PROFILE_SAMPLE_EVERY and PROFILE_ALLOCATIONS"""
+        return cls(os.environ.get("PROFILE_DIR", "profiles"),
+                   int(os.environ.get("PROFILE_SAMPLE_EVERY", 0)),
+                   os.environ.get("PROFILE_ALLOCATIONS", "0") == "1",
+                   int(os.environ.get("PROFILE_DUMP_EVERY", 50)))
+
+    def call(self, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), profiling the call if it is one of the sampled ones"""
+        if not self.sample_every or next(self._calls) % self.sample_every:
+            return fn(*args, **kwargs)
+        # cProfile sessions cannot overlap (from Python 3.12 a second one raises).
+        if not self._profiling.acquire(blocking=False):
+            return fn(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            self._profiling.release()
+            self._add(profile)
+
+    def _add(self, profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.sampled += 1
+            due = self.dump_every and self.sampled % self.dump_every == 0
+        if due:
+            self.dump()
+
+    def configure(self, sample_every=None, allocations=None):
+        """Change the sampling rate (0 stops sampling) or switch allocation reports on or off"""
+        if sample_every is not None:
+            if sample_every < 0:
+                raise ValueError("sample_every must be 0 or more")
+            self.sample_every = sample_every
+        if allocations is not None:
+            self.allocations_enabled = bool(allocations)
+
+    def dump(self):
+        """Write the aggregated search profile, if any, and return the paths written"""
+        with self._lock:
+            if self._stats is None:
+                return []
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, f"search-{os.getpid()}")
+            self._stats.dump_stats(f"{base}.pstats")
+            report = self._stats.stream = io.StringIO()
+            self._stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+        with open(f"{base}.txt", 'w') as f:
+            f.write(f"{self.sampled} sampled calls\n")
+            f.write(report.getvalue())
+        return [f"{base}.pstats", f"{base}.txt"]
+
+    def reset(self):
+        """Drop the aggregated search profile"""
+        with self._lock:
+            self._stats = None
+            self.sampled = 0
+
+    @contextmanager
+    def allocations(self, stage):
+        """Report the memory allocated in the block, by line, when allocation reports are on"""
+        if not self.allocations_enabled:
+            yield
+            return
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started:
+                tracemalloc.stop()
+            self._write_allocations(stage, after.compare_to(before, "lineno"), seconds, peak)
+
+    def _write_allocations(self, stage, differences, seconds, peak):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"alloc-{stage}-{os.getpid()}-{int(time.time())}.txt")
+        with open(path, 'w') as f:
+            f.write(f"{stage}: {seconds:.2f}s, {sum(d.size_diff for d in differences) / 2**20:+.1f} MiB "
+                    f"retained, {peak / 2**20:.1f} MiB peak traced\n")
+            for difference in differences[:REPORT_LINES]:
+                f.write(f"{difference}\n")
+        return path
+
+    def stats(self):
+        """Return the current settings and the number of sampled calls"""
+        return {
+            "directory": self.directory,
+            "sample_every": self.sample_every,
+            "allocations": self.allocations_enabled,
+            "sampled": self.sampled,
+        }
+
+
+PROFILER = Profiler.from_env()
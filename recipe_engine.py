@@ -1,27 +1,569 @@
-import pandas as pd
+import json
+import math
+import numpy as np
 import os
 import random
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+import time
 import re
+from concurrent.futures import ThreadPoolExecutor
+from recipe_index import RecipeIndex, RecipeRecord, dataset_fingerprint, dataset_stat, default_index_dir
+from constraint_index import INGREDIENT_MATCH_MODES
+from recipe_parsing import parse_ingredients, parse_instructions
+from query_cache import LRUCache
+from index_snapshot import ChangeLog, IndexSnapshot, file_lock, normalize_record, plain_values
+# pandas and scikit-learn are imported where they are first needed (by RecipeIndex when
+# a vectorizer is made, by ingest when the index is built), so importing this is cheap.
+from metrics import EMPTY_FILTER_FALLBACKS, QUERIES, RESULT_COUNTS, span
+from profiling import PROFILER
+
+RETRIEVAL_MODES = ("exact", "ann")
+# Pruned top-k search is used when the query terms' postings are at most this share of the
+# index's nonzeros; beyond it the full matrix-vector product is about as cheap.
+PRUNING_MAX_POSTINGS_SHARE = 0.5
+# search_many scores at most about this many (recipe, query) pairs at once; the sparse score
+# matrix and its column-major copy take up to 24 bytes per pair.
+SEARCH_MANY_MAX_SCORES = 1 << 23
 
 class RecipeEngine:
-    def __init__(self, dataset_path="data/recipes.csv"):
-        """Initialize the recipe engine with a dataset"""
-        self.load_dataset(dataset_path)
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+    def __init__(self, dataset_path=None, index_dir=None, mmap=None, ingredient_match=None,
+                 retrieval=None, shards=None, shard=None):
+        """Initialize the recipe engine with a dataset, reusing a persisted index when it is current
+
+        Arguments left as None come from RECIPE_DATASET, RECIPE_INDEX_MMAP, RECIPE_INGREDIENT_MATCH,
+        RECIPE_RETRIEVAL, RECIPE_SHARDS and RECIPE_SHARD; the README's Configuration section
+        describes these and the other settings read from the environment.
+        """
+        self.dataset_path = dataset_path or os.environ.get("RECIPE_DATASET", "data/recipes.csv")
+        self.index_dir = index_dir or default_index_dir(self.dataset_path)
+        if ingredient_match is None:
+            ingredient_match = os.environ.get("RECIPE_INGREDIENT_MATCH", "substring")
+        if ingredient_match not in INGREDIENT_MATCH_MODES:
+            raise ValueError(f"ingredient_match must be one of {INGREDIENT_MATCH_MODES}, got {ingredient_match!r}")
+        self.ingredient_match = ingredient_match
+        self.result_cache = LRUCache(int(os.environ.get("RESULT_CACHE_SIZE", 10000)),
+                                     float(os.environ.get("RESULT_CACHE_TTL", 300)) or None)
+        self.vectorizer = None
         self.recipe_vectors = None
-        self.process_dataset()
+        self.snapshot = None
+        self._recipes_df = (None, None)
+        self.change_log = ChangeLog(f"{self.index_dir}.changes.jsonl")
+        self.merge_threshold = int(os.environ.get("RECIPE_MERGE_THRESHOLD", 1000))
+        self.changes_poll = float(os.environ.get("RECIPE_CHANGES_POLL", 1.0))
+        self._changes = []
+        self._log_stat = None
+        self._log_current = False
+        self._next_poll = 0.0
+        self._write_lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._merge_thread = None
+        self.index_lock_path = f"{self.index_dir}.lock"
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._checked_dataset_stat = None
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        if retrieval is None:
+            retrieval = os.environ.get("RECIPE_RETRIEVAL", "exact")
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval must be one of {RETRIEVAL_MODES}, got {retrieval!r}")
+        self.retrieval = retrieval
+        self.ann_probe = int(os.environ.get("RECIPE_ANN_PROBE", 16))
+        self.ann_candidates = int(os.environ.get("RECIPE_ANN_CANDIDATES", 200))
+        self.ann_components = int(os.environ.get("RECIPE_ANN_COMPONENTS", 128))
+        self.ann_lists = int(os.environ.get("RECIPE_ANN_LISTS", 0)) or None
+        self.ann_path = f"{self.index_dir}.ann"
+        self.pruning = os.environ.get("RECIPE_PRUNING", "1") == "1"
+        if shards is None:
+            shards = int(os.environ.get("RECIPE_SHARDS", 1))
+        if shards < 1:
+            raise ValueError(f"shards must be 1 or more, got {shards!r}")
+        if shard is None:
+            shard = os.environ.get("RECIPE_SHARD")
+        if isinstance(shard, str):
+            shard = tuple(int(part) for part in shard.split("/"))
+        if shard is not None:
+            if len(shard) != 2 or not 0 <= shard[0] < shard[1]:
+                raise ValueError(f"shard must be (i, n) with 0 <= i < n, got {shard!r}")
+            if shards > 1 or retrieval != "exact":
+                raise ValueError("a shard server searches its shard with exact retrieval and no shards of its own")
+        self.shards = shards
+        self.shard = shard
+        if mmap is None:
+            # A shard server maps the whole index and so reads little more than its own shard of it.
+            mmap = os.environ.get("RECIPE_INDEX_MMAP", "1" if shard is not None else "0") == "1"
+        self.mmap = mmap
+        self._shards = (None, [])
+        # (pid, pool) of the threads that search shards; see _shard_pool().
+        self._shard_executor = (None, None)
+        self._shard_executor_lock = threading.Lock()
+        self._ann = None
+        self._ann_lock = threading.Lock()
+        self._ann_thread = None
+        with PROFILER.allocations("load_index"):
+            loaded = self.load_index()
+        if not loaded:
+            # As in refresh(): one process builds while the others wait, then load its index.
+            with file_lock(self.index_lock_path):
+                with PROFILER.allocations("load_index"):
+                    loaded = self.load_index()
+                if not loaded:
+                    with PROFILER.allocations("build_index"):
+                        self.build_index()
+        if self.retrieval == "ann":
+            self.prepare_ann()
+    
+    @property
+    def index(self):
+        """The base RecipeIndex of the snapshot currently served"""
+        return self.snapshot.base if self.snapshot is not None else None
+    
+    @property
+    def recipes_df(self):
+        """Live recipes as a DataFrame, materialized from the current snapshot on first access"""
+        snapshot = self.snapshot
+        version = snapshot.version if snapshot is not None else None
+        cached_version, recipes_df = self._recipes_df
+        if snapshot is not None and (recipes_df is None or cached_version != version):
+            recipes_df = snapshot.to_dataframe()
+            self._recipes_df = (version, recipes_df)
+        return recipes_df
+    
+    @recipes_df.setter
+    def recipes_df(self, recipes_df):
+        self._recipes_df = (self.snapshot.version if self.snapshot is not None else None, recipes_df)
+    
+    def load_index(self):
+        """Load the persisted index for the dataset; return False if it is missing or stale"""
+        start = time.perf_counter()
+        try:
+            index = RecipeIndex.load_for_dataset(self.index_dir, self.dataset_path, mmap=self.mmap)
+        except Exception as e:
+            print(f"Error loading recipe index: {e}")
+            index = None
+        if index is None:
+            return False
+        
+        self._use_index(index)
+        print(f"Loaded recipe index with {len(index)} recipes in {time.perf_counter() - start:.2f}s"
+              f"{' (memory-mapped)' if self.mmap else ''}")
+        return True
+    
+    def build_index(self):
+        """Fit the index by streaming the dataset CSV, falling back to loading it whole"""
+        from ingest import build_index_from_dataset
+        try:
+            index = build_index_from_dataset(self.dataset_path)
+        except Exception as e:
+            print(f"Error streaming dataset: {e}")
+            with PROFILER.allocations("load_dataset"):
+                self.load_dataset(self.dataset_path)
+            with PROFILER.allocations("process_dataset"):
+                self.process_dataset()
+            index = None
+        self.save_index(index)
+    
+    def save_index(self, index=None):
+        """Persist the fitted index so the next start can skip the fit, then serve from it"""
+        if index is None:
+            index = RecipeIndex.build(self.recipes_df, self.vectorizer, self.recipe_vectors, self.dataset_path)
+        try:
+            index.save(self.index_dir)
+            if self.mmap:
+                index = RecipeIndex.load(self.index_dir, mmap=True)
+        except Exception as e:
+            print(f"Error saving recipe index: {e}")
+        self._use_index(index)
+    
+    @property
+    def index_version(self):
+        """Version of the snapshot currently served; changes whenever the catalog does"""
+        return self.snapshot.version
+    
+    def _use_index(self, index):
+        with self._write_lock:
+            self._changes = []
+            self._log_stat = None
+            self._set_snapshot(IndexSnapshot(index))
+            self._sync_changes()
+    
+    def _set_snapshot(self, snapshot):
+        if ((self.shards > 1 and self.retrieval == "exact") or self.shard is not None) \
+                and self._shards[0] is not snapshot.base:
+            self._shards = (snapshot.base, self._build_shards(snapshot.base))
+        self.snapshot = snapshot
+        self.vectorizer = snapshot.vectorizer
+        self.recipe_vectors = snapshot.base.recipe_vectors
+    
+    def _build_shards(self, base):
+        """Split a base index into (first row, RecipeIndex) shards of consecutive rows, or
+        only this engine's shard for a shard server
+
+        The shards are views of the base index's arrays, so a memory-mapped index stays
+        shared between processes.
+        """
+        start = time.perf_counter()
+        n_shards = self.shard[1] if self.shard is not None else self.shards
+        bounds = np.linspace(0, len(base), n_shards + 1).astype(np.int64)
+        ranges = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+        if self.shard is not None:
+            ranges = [ranges[self.shard[0]]]
+        shards = [(first, base.view(first, stop)) for first, stop in ranges if stop > first]
+        if self.shard is not None:
+            print(f"Serving shard {self.shard[0]} of {self.shard[1]} ({sum(len(shard) for _, shard in shards)} "
+                  f"recipes) in {time.perf_counter() - start:.2f}s")
+        else:
+            print(f"Split recipe index into {len(shards)} shards in {time.perf_counter() - start:.2f}s")
+        return shards
+    
+    def _shards_for(self, snapshot):
+        """The shards of the snapshot's base index to search, or None to search it whole"""
+        base, shards = self._shards
+        if base is snapshot.base:
+            return shards
+        if self.shard is not None:
+            # A search that started before the index was swapped; its shard is split again.
+            return self._build_shards(snapshot.base)
+        return None
+    
+    def _current_snapshot(self):
+        """Return the snapshot to serve, first applying other processes' changes if it is time to look
+
+        Once the watcher thread runs it does the looking, and this only reads the reference.
+        """
+        now = time.monotonic()
+        if self._watcher is None and now >= self._next_poll:
+            self._next_poll = now + self.changes_poll
+            # Never wait behind a change or merge in progress; the next poll catches up.
+            if self._write_lock.acquire(blocking=False):
+                try:
+                    self._sync_changes()
+                finally:
+                    self._write_lock.release()
+        return self.snapshot
+    
+    def _sync_changes(self):
+        """Replay change-log entries the current snapshot lacks; call with the write lock held"""
+        stat = self.change_log.stat()
+        if stat == self._log_stat:
+            return
+        self._log_stat = stat
+        try:
+            header, changes = self.change_log.read()
+            snapshot = self.snapshot
+            self._log_current = header is not None and header.get("dataset_hash") == snapshot.base.dataset_hash
+            if not self._log_current:
+                return
+            manifest = RecipeIndex.read_manifest(self.index_dir)
+            if (manifest is not None and manifest["version"] != snapshot.base.version
+                    and manifest["dataset_hash"] == snapshot.base.dataset_hash
+                    and manifest["applied_seq"] > snapshot.base.applied_seq):
+                # Another process merged the changes into a newer saved index.
+                snapshot = IndexSnapshot(RecipeIndex.load(self.index_dir, manifest, mmap=self.mmap))
+            for change in changes:
+                if change["seq"] > snapshot.seq:
+                    snapshot = snapshot.apply(change)
+        except Exception as e:
+            print(f"Error applying recipe changes: {e}")
+            return
+        self._changes = [change for change in changes if change["seq"] > snapshot.base.applied_seq]
+        if snapshot is not self.snapshot:
+            self._set_snapshot(snapshot)
+    
+    def refresh(self, wait=True):
+        """Swap in a newer index if the dataset changed, and apply new changes from the log
+
+        A changed dataset is indexed off the request path: the index another process saved
+        for it is loaded, or else it is built here, under a lock so that only one process
+        builds. Searches keep using the current snapshot until the new one replaces it, and
+        a search already running finishes on the snapshot it started with. With wait=False
+        the refresh runs on a background thread. Returns True if the index was replaced.
+        """
+        if not wait:
+            thread = self._refresh_thread
+            if thread is None or not thread.is_alive():
+                self._refresh_thread = threading.Thread(target=self.refresh, name="recipe-index-refresh",
+                                                        daemon=True)
+                self._refresh_thread.start()
+            return None
+        
+        with self._refresh_lock:
+            swapped = False
+            if self._dataset_changed():
+                from ingest import build_index_from_dataset
+                start = time.perf_counter()
+                with file_lock(self.index_lock_path), PROFILER.allocations("refresh_index"):
+                    # Another process may have indexed the new dataset while we waited.
+                    index = RecipeIndex.load_for_dataset(self.index_dir, self.dataset_path, mmap=self.mmap)
+                    if index is None:
+                        index = build_index_from_dataset(self.dataset_path)
+                        index.save(self.index_dir)
+                        if self.mmap:
+                            index = RecipeIndex.load(self.index_dir, mmap=True)
+                self._use_index(index)
+                swapped = True
+                print(f"Swapped in recipe index with {len(index)} recipes in {time.perf_counter() - start:.2f}s")
+            with self._write_lock:
+                self._sync_changes()
+            return swapped
+    
+    def _dataset_changed(self):
+        """Return True if the dataset file's contents differ from those the index was built from"""
+        base = self.snapshot.base
+        try:
+            stat = dataset_stat(self.dataset_path)
+        except OSError:
+            return False
+        if stat == base.dataset_stat or stat == self._checked_dataset_stat:
+            return False
+        if dataset_fingerprint(self.dataset_path) == base.dataset_hash:
+            # Touched but unchanged; remember it so the file is not hashed on every poll.
+            self._checked_dataset_stat = stat
+            return False
+        return True
+    
+    def start_watcher(self, interval=None):
+        """Call refresh() every interval (or RECIPE_WATCH_INTERVAL, default 5) seconds on a thread
+
+        Threads do not survive fork, so a preloaded gunicorn app starts the watcher in each
+        worker (see gunicorn_config.py).
+        """
+        if interval is None:
+            interval = float(os.environ.get("RECIPE_WATCH_INTERVAL", 5))
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop_watching.clear()
+        
+        def watch():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing recipe index: {e}")
+                if self._stop_watching.wait(interval):
+                    break
+        
+        self._watcher = threading.Thread(target=watch, name="recipe-index-watcher", daemon=True)
+        self._watcher.start()
+    
+    def stop_watcher(self):
+        """Stop the watcher thread; searches go back to polling the change log themselves"""
+        watcher = self._watcher
+        if watcher is not None:
+            self._stop_watching.set()
+            watcher.join()
+            self._watcher = None
+    
+    def add_recipes(self, recipes):
+        """Add recipes to the catalog without refitting the vectorizer; return their new ids
+
+        Each recipe is a dict of dataset fields, recipe_name required. The recipes are
+        vectorized against the fitted vocabulary into the delta segment, logged, and
+        visible to searches once this returns.
+        """
+        if not recipes:
+            return []
+        
+        def change(snapshot):
+            records = [normalize_record(recipe, snapshot.base) for recipe in recipes]
+            return {"ids": list(range(snapshot.next_id, snapshot.next_id + len(records))), "records": records}
+        
+        return self._commit_change(change)["ids"]
+    
+    def update_recipe(self, recipe_id, fields):
+        """Replace some fields of a recipe, keeping its id; raises KeyError for an unknown id"""
+        recipe_id = int(recipe_id)
+        
+        def change(snapshot):
+            i = snapshot.position(recipe_id)
+            if i < 0:
+                raise KeyError(recipe_id)
+            record = normalize_record({**plain_values(snapshot.record(i)), **fields}, snapshot.base)
+            return {"remove": [recipe_id], "ids": [recipe_id], "records": [record]}
+        
+        self._commit_change(change)
+        return recipe_id
+    
+    def remove_recipes(self, recipe_ids):
+        """Delete recipes by id and return how many; raises KeyError, changing nothing, for an unknown id"""
+        recipe_ids = list(dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids))
+        if recipe_ids:
+            self._commit_change(lambda snapshot: {"remove": recipe_ids})
+        return len(recipe_ids)
+    
+    def get_recipe(self, recipe_id):
+        """Return a live recipe's id and fields as plain values; raises KeyError for an unknown id"""
+        snapshot = self._current_snapshot()
+        i = snapshot.position(int(recipe_id))
+        if i < 0:
+            raise KeyError(recipe_id)
+        return {'id': snapshot.recipe_id(i), **plain_values(snapshot.record(i))}
+    
+    def _commit_change(self, make_change):
+        """Apply, log and publish one change made by make_change(snapshot) as a new snapshot"""
+        with self._write_lock, self.change_log.locked():
+            self._sync_changes()
+            snapshot = self.snapshot
+            change = {"seq": snapshot.seq + 1, **make_change(snapshot)}
+            updated = snapshot.apply(change)
+            try:
+                if self._log_current:
+                    self.change_log.append(change)
+                else:
+                    header = {"dataset_hash": snapshot.base.dataset_hash}
+                    self.change_log.rewrite(header, [*self._changes, change])
+                    self._log_current = True
+                self._log_stat = self.change_log.stat()
+            except OSError as e:
+                print(f"Error writing recipe change log: {e}")
+            self._changes.append(change)
+            self._set_snapshot(updated)
+        
+        pending = len(updated) - len(updated.base) + updated.n_deleted
+        if self.merge_threshold and pending >= self.merge_threshold:
+            self.merge_segments(wait=False)
+        return change
+    
+    def merge_segments(self, wait=True):
+        """Fold the delta segment and deletions into a new base index and save it
+
+        With wait=False the merge runs on a background thread. Searches and changes go on
+        against the current snapshot meanwhile; changes made during the merge are
+        replayed on top of the merged index before it is swapped in.
+        """
+        if wait:
+            return self._merge()
+        thread = self._merge_thread
+        if thread is None or not thread.is_alive():
+            self._merge_thread = threading.Thread(target=self._merge, name="recipe-index-merge", daemon=True)
+            self._merge_thread.start()
+        return None
+    
+    def _merge(self):
+        with self._merge_lock:
+            snapshot = self.snapshot
+            if snapshot.delta is None and not snapshot.n_deleted:
+                return False
+            start = time.perf_counter()
+            merged = snapshot.compact()
+            
+            with self._write_lock, self.change_log.locked(), file_lock(self.index_lock_path):
+                self._sync_changes()
+                manifest = RecipeIndex.read_manifest(self.index_dir)
+                if self.snapshot.base is not snapshot.base or (
+                        manifest is not None and manifest["dataset_hash"] != merged.dataset_hash):
+                    # The index was replaced meanwhile, here or (for a new dataset) elsewhere.
+                    return False
+                try:
+                    merged.save(self.index_dir)
+                    if self.mmap:
+                        merged = RecipeIndex.load(self.index_dir, mmap=True)
+                except Exception as e:
+                    print(f"Error saving merged recipe index: {e}")
+                    return False
+                changes = [change for change in self._changes if change["seq"] > merged.applied_seq]
+                updated = IndexSnapshot(merged, vectorizer=snapshot.vectorizer)
+                for change in changes:
+                    updated = updated.apply(change)
+                try:
+                    self.change_log.rewrite({"dataset_hash": merged.dataset_hash}, changes)
+                    self._log_stat = self.change_log.stat()
+                    self._log_current = True
+                except OSError as e:
+                    print(f"Error writing recipe change log: {e}")
+                self._changes = changes
+                self._set_snapshot(updated)
+            
+            print(f"Merged recipe changes into an index of {len(merged)} recipes in {time.perf_counter() - start:.2f}s")
+            return True
+    
+    def index_stats(self):
+        """Return the sizes of the current snapshot's segments"""
+        snapshot = self.snapshot
+        thread = self._merge_thread
+        return {
+            'index_version': snapshot.version,
+            'recipes': snapshot.n_recipes,
+            'base_recipes': len(snapshot.base),
+            'delta_recipes': len(snapshot) - len(snapshot.base),
+            'deleted': snapshot.n_deleted,
+            'seq': snapshot.seq,
+            'merged_seq': snapshot.base.applied_seq,
+            'merging': thread is not None and thread.is_alive(),
+            'retrieval': self.retrieval,
+            'ann_ready': self._ann is not None and self._ann.index_version == snapshot.base.version,
+            'shards': self.shards,
+            'shard': list(self.shard) if self.shard is not None else None,
+        }
+        
+    def prepare_ann(self, wait=True):
+        """Load, or else build and save, the ANN index of the current base index
+
+        An ANN index saved for the base index (e.g. by another process) is loaded. Failing
+        that, one saved for an earlier base with the same vocabulary, as a merge leaves
+        behind, has its rows reassigned; otherwise a new one is trained. Searches in ann
+        mode on a base index without its ANN index start this on a background thread
+        (wait=False) and score every recipe until it is ready.
+        """
+        if not wait:
+            thread = self._ann_thread
+            if thread is None or not thread.is_alive():
+                self._ann_thread = threading.Thread(target=self.prepare_ann, name="recipe-ann-build", daemon=True)
+                self._ann_thread.start()
+            return None
+        
+        with self._ann_lock:
+            base = self.snapshot.base
+            ann = self._ann
+            if ann is not None and ann.index_version == base.version:
+                return ann
+            from ann_index import AnnIndex
+            with file_lock(f"{self.ann_path}.lock"):
+                saved = AnnIndex.load(self.ann_path, mmap=self.mmap)
+                if saved is not None and saved.index_version == base.version:
+                    ann = saved
+                else:
+                    start = time.perf_counter()
+                    if saved is not None and saved.can_reindex(base, self.ann_components):
+                        ann = saved.reindex(base)
+                    else:
+                        ann = AnnIndex.train(base, self.ann_components, self.ann_lists)
+                    try:
+                        ann.save(self.ann_path)
+                    except Exception as e:
+                        print(f"Error saving ANN index: {e}")
+                    print(f"Built ANN index of {ann.n_lists} lists for {len(base)} recipes "
+                          f"in {time.perf_counter() - start:.2f}s")
+            self._ann = ann
+            return ann
+    
+    def _ann_for(self, snapshot):
+        """The ANN index to search the snapshot with, or None to score every recipe"""
+        if self.retrieval != "ann":
+            return None
+        ann = self._ann
+        if ann is not None and ann.index_version == snapshot.base.version:
+            return ann
+        self.prepare_ann(wait=False)
+        return None
         
     def load_dataset(self, dataset_path):
         """Load and prepare the recipe dataset"""
+        import pandas as pd
+        from ingest import is_columnar, read_columnar
         try:
-            self.recipes_df = pd.read_csv(dataset_path)
+            if is_columnar(dataset_path):
+                self.recipes_df = pd.DataFrame({
+                    name: column if isinstance(column, np.ndarray) else column.tolist()
+                    for name, column in read_columnar(dataset_path).items()})
+            else:
+                self.recipes_df = pd.read_csv(dataset_path)
             print(f"Loaded {len(self.recipes_df)} recipes")
         except Exception as e:
             print(f"Error loading dataset: {e}")
             self._create_sample_dataset()
-            self.recipes_df = pd.read_csv("data/recipes.csv")
+            self.dataset_path = "data/recipes.csv"
+            self.recipes_df = pd.read_csv(self.dataset_path)
             print(f"Created and loaded sample dataset with {len(self.recipes_df)} recipes")
     
     def _create_sample_dataset(self):
@@ -120,51 +662,409 @@ class RecipeEngine:
             ]
         }
         
+        import pandas as pd
         df = pd.DataFrame(sample_data)
         df.to_csv('data/recipes.csv', index=False)
     
     def process_dataset(self):
         """Process and vectorize the recipe dataset"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        start = time.perf_counter()
         self.recipes_df['recipe_text'] = (
             self.recipes_df['recipe_name'].fillna('') + ' ' +
             self.recipes_df['ingredients'].fillna('')
         )
         
+        self.vectorizer = TfidfVectorizer(stop_words='english')
         self.recipe_vectors = self.vectorizer.fit_transform(self.recipes_df['recipe_text'])
+        print(f"Built recipe index in {time.perf_counter() - start:.2f}s")
     
     def search_recipes(self, query, constraints=None, top_n=3):
         """Search for recipes matching the query and constraints"""
-        query_vector = self.vectorizer.transform([query])
+        snapshot = self._current_snapshot()
+        key = self._cache_key(query, constraints, top_n)
+        version = snapshot.version
+        results = self.result_cache.get(key, version)
+        if results is None:
+            results = self._search_recipes(snapshot, query, constraints, top_n)
+            self.result_cache.put(key, results, version)
+        QUERIES.inc()
+        RESULT_COUNTS.observe(len(results))
+        return list(results)
+    
+    def search_partition(self, query, constraints=None, top_n=3):
+        """Search only this engine's part of the catalog, for a coordinator that merges the
+        results of every shard server
+
+        Returns (matched, [(row, RecipeRecord)]), where rows number the recipes across the
+        whole catalog so that score ties between shards are broken as one engine breaks
+        them. matched is False, with no records, when none of the shard's live recipes
+        meets the constraints; there is no fallback to every recipe here, since that
+        depends on the other shards, so the coordinator searches again without constraints
+        when no shard matched. An engine that is not a shard server searches everything.
+        """
+        snapshot = self._current_snapshot()
+        key = self._cache_key(query, constraints, top_n) + ("partition",)
+        version = snapshot.version
+        found = self.result_cache.get(key, version)
+        if found is None:
+            with span("vectorize"):
+                query_vector = snapshot.vectorizer.transform([query])
+            with span("score"):
+                shards = self._shards_for(snapshot)
+                parts = [(0, snapshot)] if shards is None else self._parts(snapshot, shards)
+                tops = [top for top in self._parts_top(parts, query_vector, constraints, top_n) if top is not None]
+                top = self._merge_tops(tops, top_n)
+            with span("records"):
+                found = (bool(tops), [(idx, self._record(snapshot, idx, score)) for idx, score in top])
+            self.result_cache.put(key, found, version)
+        QUERIES.inc()
+        return found[0], list(found[1])
+    
+    def _cache_key(self, query, constraints, top_n):
+        # The vectorizer lower-cases and ignores whitespace, so neither changes the result.
+        retrieval = (self.ann_probe, self.ann_candidates) if self.retrieval == "ann" else None
+        return (" ".join(query.lower().split()), json.dumps(constraints or {}, sort_keys=True, default=str),
+                top_n, retrieval)
+    
+    def _search_recipes(self, snapshot, query, constraints, top_n):
+        with span("vectorize"):
+            query_vector = snapshot.vectorizer.transform([query])
+        shards = self._shards_for(snapshot)
+        if shards is not None:
+            with span("score"):
+                top = self._sharded_top(snapshot, shards, query_vector, constraints, top_n)
+            with span("records"):
+                return [self._record(snapshot, idx, score) for idx, score in top]
+        with span("filter"):
+            mask = self._search_mask(snapshot, constraints)
+        with span("score"):
+            top = None
+            ann = self._ann_for(snapshot)
+            if ann is not None:
+                top = self._ann_top(snapshot, ann, query_vector, ann.project(query_vector)[0], mask, top_n)
+            if top is None:
+                top = self._exact_top(snapshot, query_vector, mask, top_n)
+        with span("records"):
+            return [self._record(snapshot, idx, score) for idx, score in top]
+    
+    def _exact_top(self, snapshot, query_vector, mask, top_n):
+        """Return (index, score) of the top_n allowed recipes by exact score"""
+        if self.pruning and top_n > 0 and query_vector.nnz:
+            top = self._pruned_top(snapshot, query_vector, mask, top_n)
+            if top is not None:
+                return top
+        # Recipe rows and the query are already L2-normalised by the vectorizer, so a
+        # plain dot product is their cosine similarity.
+        similarity_scores = snapshot.scores(query_vector.toarray().ravel())
+        return [(idx, similarity_scores[idx]) for idx in self._top_indices(similarity_scores, mask, top_n)]
+    
+    def _sharded_top(self, snapshot, shards, query_vector, constraints, top_n):
+        """Return (index, score) of the top_n allowed recipes, searching the base index shards
+        and the delta segment in parallel
+
+        Each part returns its own top_n, ties broken by row as everywhere, so the best
+        top_n of their union by score and then index is the unsharded result, zero-score
+        places included. When no part has a recipe meeting the constraints, all are
+        searched again without them, as _search_mask falls back.
+        """
+        parts = self._parts(snapshot, shards)
+        tops = self._parts_top(parts, query_vector, constraints, top_n)
+        if tops and all(top is None for top in tops):
+            EMPTY_FILTER_FALLBACKS.inc()
+            tops = self._parts_top(parts, query_vector, None, top_n)
+        return self._merge_tops(tops, top_n)
+    
+    def _parts(self, snapshot, shards):
+        """(first row, IndexSnapshot) of the shards and, unless this is a shard server other
+        than shard 0, the delta segment"""
+        parts = [(first, IndexSnapshot(shard, deleted=snapshot.deleted[first:first + len(shard)],
+                                       vectorizer=snapshot.vectorizer))
+                 for first, shard in shards]
+        if snapshot.delta is not None and (self.shard is None or self.shard[0] == 0):
+            parts.append((len(snapshot.base), IndexSnapshot(snapshot.delta, vectorizer=snapshot.vectorizer)))
+        return parts
+    
+    def _shard_pool(self):
+        """This process's thread pool for searching shards, made on first use in each process
+
+        A pool inherited through a fork (a gunicorn master warmed up with preload_app)
+        has no threads in the child and never starts new ones, so its searches would
+        wait forever. The calling thread searches one shard itself, so the pool runs
+        the others.
+        """
+        pid, executor = self._shard_executor
+        if pid != os.getpid():
+            with self._shard_executor_lock:
+                pid, executor = self._shard_executor
+                if pid != os.getpid():
+                    executor = ThreadPoolExecutor(self.shards - 1, thread_name_prefix="shard")
+                    self._shard_executor = (os.getpid(), executor)
+        return executor
+    
+    def _parts_top(self, parts, query_vector, constraints, top_n):
+        """Return the (index, score) top of each part, or None for parts where no live recipe
+        meets the constraints; the calling thread searches the first part itself"""
+        futures = []
+        if self.shards > 1 and len(parts) > 1:
+            executor = self._shard_pool()
+            futures = [executor.submit(self._part_top, part, query_vector, constraints, top_n)
+                       for _, part in parts[1:]]
+        tops = [self._part_top(part, query_vector, constraints, top_n)
+                for _, part in parts[:len(parts) - len(futures)]]
+        tops += [future.result() for future in futures]
+        return [None if top is None else [(first + idx, score) for idx, score in top]
+                for (first, _), top in zip(parts, tops)]
+    
+    def _merge_tops(self, tops, top_n):
+        """Return the top_n (index, score) of several tops by score, ties by index"""
+        ids = np.array([idx for top in tops for idx, _ in top or ()], dtype=np.int64)
+        scores = np.array([score for top in tops for _, score in top or ()], dtype=float)
+        order = np.lexsort((ids, -scores))[:top_n]
+        return list(zip(ids[order].tolist(), scores[order].tolist()))
+    
+    def _part_top(self, part, query_vector, constraints, top_n):
+        """Return (row, score) of the top_n allowed recipes of one shard, or None if none of
+        its live recipes meets the constraints"""
+        mask = self._allowed_mask(part, constraints)
+        if mask is None:
+            mask = part.alive
+        elif not mask.any():
+            return None
+        return self._exact_top(part, query_vector, mask, top_n)
+    
+    def _pruned_top(self, snapshot, query_vector, mask, top_n):
+        """Return (index, score) of the top_n allowed recipes, scoring only base recipes that
+        can make the top_n and every delta recipe, or None if that would not save work"""
+        base = snapshot.base
+        postings = base.postings
+        terms = query_vector.indices
+        if postings.postings_size(terms) > PRUNING_MAX_POSTINGS_SHARE * base.recipe_vectors.nnz:
+            return None
+        query = query_vector.toarray().ravel()
+        # Gathering rows keeps each row's terms in order, so scores match the full product exactly.
+        rows, scores = postings.top_candidates(terms, query_vector.data, top_n,
+                                               lambda rows: base.recipe_vectors[rows] @ query,
+                                               len(base), None if mask is None else mask[:len(base)])
+        if snapshot.delta is not None:
+            rows = np.concatenate([rows, np.arange(len(base), len(snapshot))])
+            scores = np.concatenate([scores, snapshot.delta.recipe_vectors @ query])
+        return self._top_sparse_indices(rows, scores, mask, top_n, len(snapshot))
+    
+    def _ann_top(self, snapshot, ann, query_vector, embedding, mask, top_n):
+        """Return (index, score) of the top_n allowed recipes among the ANN candidates and the delta
+        segment, scored exactly, or None when fewer than top_n of them match the query at all
+
+        In the latter case the places left would go to non-matching recipes, while some
+        recipe outside the candidates might match, so the caller scores every recipe.
+        """
+        base = snapshot.base
+        rows = ann.candidates(embedding, self.ann_probe, max(self.ann_candidates, top_n),
+                              None if mask is None else mask[:len(base)])
+        query = query_vector.toarray().ravel()
+        scores = base.recipe_vectors[rows] @ query
+        if snapshot.delta is not None:
+            rows = np.concatenate([rows, np.arange(len(base), len(snapshot))])
+            scores = np.concatenate([scores, snapshot.delta.recipe_vectors @ query])
+        top = self._top_sparse_indices(rows, scores, mask, top_n, len(snapshot))
+        if sum(score > 0 for _, score in top) < top_n:
+            return None
+        return top
+    
+    def _search_mask(self, snapshot, constraints):
+        """Mask of the rows a search may return: live recipes meeting the constraints, or
+        every live recipe if none does; None when that is every row"""
+        mask = self._allowed_mask(snapshot, constraints)
+        if mask is not None and not mask.any():
+            EMPTY_FILTER_FALLBACKS.inc()
+            mask = None
+        return snapshot.alive if mask is None else mask
+    
+    def _allowed_mask(self, snapshot, constraints):
+        """Mask of the live rows meeting the constraints, or None without constraints"""
+        mask = self._constraint_mask(constraints, snapshot)
+        alive = snapshot.alive
+        if mask is not None and alive is not None:
+            mask &= alive
+        return mask
+    
+    def search_many(self, queries, constraints_list=None, top_n=3, block_size=256):
+        """Search for many queries at once; returns one search_recipes-style result list per query
+
+        All queries are vectorized together and scored with one sparse matrix product per
+        block of block_size queries, or fewer when their terms occur in so many recipes that
+        the scores would exceed SEARCH_MANY_MAX_SCORES. Identical constraint sets share one mask.
+        """
+        if constraints_list is None:
+            constraints_list = [None] * len(queries)
+        if len(constraints_list) != len(queries):
+            raise ValueError("constraints_list must have one entry per query")
         
-        similarity_scores = cosine_similarity(query_vector, self.recipe_vectors).flatten()
+        snapshot = self._current_snapshot()
+        version = snapshot.version
+        keys = [self._cache_key(q, c, top_n) for q, c in zip(queries, constraints_list)]
+        results = [self.result_cache.get(key, version) for key in keys]
+        misses = [i for i, cached in enumerate(results) if cached is None]
+        for i, found in zip(misses, self._search_many(snapshot, [queries[i] for i in misses],
+                                                      [constraints_list[i] for i in misses],
+                                                      top_n, block_size)):
+            results[i] = found
+            self.result_cache.put(keys[i], found, version)
+        QUERIES.inc(len(results))
+        for found in results:
+            RESULT_COUNTS.observe(len(found))
+        return [list(found) for found in results]
+    
+    def _search_many(self, snapshot, queries, constraints_list, top_n, block_size):
+        if self.shard is not None:
+            # A shard server searches only its shard, which the block product does not.
+            return [self._search_recipes(snapshot, query, constraints, top_n)
+                    for query, constraints in zip(queries, constraints_list)]
+        masks = {}
+        query_masks = []
+        with span("filter"):
+            for constraints in constraints_list:
+                key = json.dumps(constraints or {}, sort_keys=True, default=str)
+                if key not in masks:
+                    masks[key] = self._search_mask(snapshot, constraints)
+                query_masks.append(masks[key])
         
-        filtered_indices = self._filter_by_constraints(constraints)
-            
-        if not filtered_indices:
-            filtered_indices = list(range(len(self.recipes_df)))
+        tops = []
+        ann = self._ann_for(snapshot)
+        for start in range(0, len(queries), block_size):
+            with span("vectorize"):
+                query_vectors = snapshot.vectorizer.transform(queries[start:start + block_size])
+            with span("score"):
+                if ann is not None:
+                    embeddings = ann.project(query_vectors)
+                    for j in range(query_vectors.shape[0]):
+                        mask = query_masks[start + j]
+                        top = self._ann_top(snapshot, ann, query_vectors[j], embeddings[j], mask, top_n)
+                        if top is None:
+                            top = self._exact_top(snapshot, query_vectors[j], mask, top_n)
+                        tops.append(top)
+                    continue
+                for first, stop in self._score_blocks(snapshot.score_nonzeros(query_vectors)):
+                    # recipes x queries, so each score sums terms in the same order as search_recipes.
+                    scores = snapshot.score_matrix(query_vectors[first:stop]).tocsc()
+                    for j in range(stop - first):
+                        column = slice(scores.indptr[j], scores.indptr[j + 1])
+                        ids, values = scores.indices[column], scores.data[column]
+                        tops.append(self._top_sparse_indices(ids, values, query_masks[start + first + j],
+                                                             top_n, len(snapshot)))
+        with span("records"):
+            return [[self._record(snapshot, idx, score) for idx, score in top] for top in tops]
+    
+    def _score_blocks(self, bounds):
+        """Split queries into (first, stop) runs whose nonzero score bounds sum to at most
+        SEARCH_MANY_MAX_SCORES, or single queries that exceed it alone"""
+        first, total = 0, 0
+        for j, bound in enumerate(bounds.tolist()):
+            if j > first and total + bound > SEARCH_MANY_MAX_SCORES:
+                yield first, j
+                first, total = j, 0
+            total += bound
+        if first < len(bounds):
+            yield first, len(bounds)
+    
+    def _record(self, snapshot, idx, score):
+        return RecipeRecord(snapshot.recipe_id(idx), snapshot.record(idx), float(score), snapshot.parsed(idx))
+    
+    def _top_sparse_indices(self, ids, scores, mask, top_n, n_recipes):
+        """Return (index, score) of the top_n allowed recipes given only the nonzero scores
+
+        Every other recipe scores exactly zero, so once the positive scores run out the
+        remaining places go to allowed recipes in index order, as in _top_indices.
+        """
+        keep = scores > 0
+        if mask is not None:
+            keep &= mask[ids]
+        ids, scores = ids[keep], scores[keep]
+        if top_n <= 0:
+            return []
         
-        top_indices = sorted([(i, similarity_scores[i]) for i in filtered_indices], 
-                            key=lambda x: x[1], reverse=True)[:top_n]
+        if len(scores) > top_n:
+            kth_score = scores[np.argpartition(-scores, top_n - 1)[top_n - 1]]
+            above = np.flatnonzero(scores > kth_score)
+            ties = np.flatnonzero(scores == kth_score)
+            ties = ties[np.argsort(ids[ties], kind='stable')][:top_n - len(above)]
+            candidates = np.concatenate([above, ties])
+            ids, scores = ids[candidates], scores[candidates]
+        order = np.lexsort((ids, -scores))[:top_n]
+        top = list(zip(ids[order].tolist(), scores[order].tolist()))
+        if len(top) < top_n:
+            zero = np.ones(n_recipes, dtype=bool) if mask is None else mask.copy()
+            zero[ids] = False
+            top.extend((idx, 0.0) for idx in np.flatnonzero(zero)[:top_n - len(top)].tolist())
+        return top
+    
+    def _top_indices(self, scores, mask, top_n):
+        """Return the indices of the top_n scores allowed by mask, best first, ties by index"""
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            n_allowed = int(np.count_nonzero(mask))
+        else:
+            n_allowed = len(scores)
+        top_n = min(top_n, n_allowed)
+        if top_n <= 0:
+            return []
         
-        results = []
-        for idx, score in top_indices:
-            recipe = self.recipes_df.iloc[idx].copy()
-            recipe['match_score'] = score
-            results.append(recipe)
-            
-        return results
+        if top_n < n_allowed:
+            kth_score = scores[np.argpartition(-scores, top_n - 1)[top_n - 1]]
+            above = np.flatnonzero(scores > kth_score)
+            ties = np.flatnonzero(scores == kth_score)[:top_n - len(above)]
+            candidates = np.concatenate([above, ties])
+        else:
+            candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(scores))
+        
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order].tolist()
     
     def _filter_by_constraints(self, constraints):
         """Apply all constraints to filter recipe indices"""
+        snapshot = self.snapshot
+        mask = self._constraint_mask(constraints, snapshot)
+        alive = snapshot.alive
+        if mask is None:
+            mask = alive
+        elif alive is not None:
+            mask &= alive
+        if mask is None:
+            return list(range(len(snapshot)))
+        return np.flatnonzero(mask).tolist()
+    
+    def _constraint_mask(self, constraints, snapshot=None):
+        """Return a boolean mask of the rows meeting all constraints, or None without constraints"""
         if not constraints:
-            return list(range(len(self.recipes_df)))
-        
-        filtered_indices = []
-        for i, recipe in self.recipes_df.iterrows():
-            if self._meets_constraints(recipe, constraints):
-                filtered_indices.append(i)
+            return None
+        snapshot = snapshot or self.snapshot
+        masks = [self._segment_constraint_mask(segment, constraints) for segment in snapshot.segments]
+        return masks[0] if len(masks) == 1 else np.concatenate(masks)
+    
+    def _segment_constraint_mask(self, index, constraints):
+        n_recipes = len(index)
+        mask = np.ones(n_recipes, dtype=bool)
+        for constraint_type, constraint_value in constraints.items():
+            if constraint_type in ('exclude_ingredients', 'include_ingredients'):
+                if not isinstance(constraint_value, list):
+                    constraint_value = [constraint_value]
+                for ingredient in constraint_value:
+                    matches = index.constraints.ingredient_mask(
+                        ingredient, index.columns['ingredients'], self.ingredient_match)
+                    if constraint_type == 'exclude_ingredients':
+                        mask &= ~matches
+                    else:
+                        mask &= matches
+            
+            elif constraint_type == 'max_time' and 'cook_time' in index.columns:
+                if index.constraints.sorted_times is not None:
+                    mask &= index.constraints.max_time_mask(constraint_value, n_recipes)
+                else:
+                    for i in np.flatnonzero(mask):
+                        if not self._meets_constraints(index.record(i), {'max_time': constraint_value}):
+                            mask[i] = False
         
-        return filtered_indices
+        return mask
     
     def _meets_constraints(self, recipe, constraints):
         """Check if a recipe meets all the specified constraints"""
@@ -194,6 +1094,30 @@ class RecipeEngine:
         
         return True
     
+    def recipe_summary(self, recipe):
+        """Return the fields the web interface shows for a recipe, ready for JSON"""
+        parsed = getattr(recipe, 'parsed', None) or {}
+        ingredients = parsed.get('ingredients')
+        if ingredients is None:
+            ingredients = parse_ingredients(recipe['ingredients'])
+        instructions = parsed.get('instructions')
+        if instructions is None:
+            instructions = parse_instructions(recipe['instructions'])
+        
+        return {
+            'name': recipe['recipe_name'],
+            'cook_time': self._cook_minutes(recipe),
+            'ingredients': ingredients,
+            'instructions': instructions
+        }
+    
+    def _cook_minutes(self, recipe):
+        """Return the recipe's cook time in whole minutes, 0 if it is missing or not a number (NaN)"""
+        try:
+            return int(recipe['cook_time']) if 'cook_time' in recipe else 0
+        except (TypeError, ValueError):
+            return 0
+    
     def format_recipe(self, recipe):
         """Format a recipe for display"""
         formatted = f"\n{'='*50}\n"
@@ -201,8 +1125,9 @@ class RecipeEngine:
         formatted += f"{'='*50}\n\n"
         
         formatted += f"⭐ Match Score: {recipe.get('match_score', 0):.2f}\n"
-        if 'cook_time' in recipe and recipe['cook_time']:
-            formatted += f"⏱️ Cook Time: {recipe['cook_time']} minutes\n"
+        cook_time = recipe.get('cook_time')
+        if cook_time and not (isinstance(cook_time, float) and math.isnan(cook_time)):
+            formatted += f"⏱️ Cook Time: {cook_time} minutes\n"
         
         formatted += f"\n📋 INGREDIENTS:\n"
         ingredients = recipe['ingredients'].split(',')
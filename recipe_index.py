@@ -0,0 +1,550 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from array import array
+import numpy as np
+from scipy import sparse
+from constraint_index import ConstraintIndex
+from term_postings import TermPostings
+from recipe_parsing import parse_ingredients, parse_instructions
+
+INDEX_FORMAT_VERSION = 6
+MANIFEST_NAME = "manifest.json"
+TEXT_PARTS = ("offsets", "bytes", "nulls")
+LIST_PARSERS = {
+    'ingredients': parse_ingredients,
+    'instructions': parse_instructions,
+}
+
+
+def default_index_dir(dataset_path):
+    """Return the directory the index artifact for a dataset lives in"""
+    return os.path.splitext(dataset_path)[0] + ".index"
+
+
+def dataset_files(dataset_path):
+    """Return the files a dataset is made of: itself, or the files of a columnar dataset directory"""
+    if not os.path.isdir(dataset_path):
+        return [dataset_path]
+    return [os.path.join(dataset_path, name) for name in sorted(os.listdir(dataset_path))]
+
+
+def dataset_fingerprint(dataset_path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a dataset's files"""
+    digest = hashlib.sha256()
+    for path in dataset_files(dataset_path):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dataset_stat(dataset_path):
+    """Return the size and latest modification time recorded for a dataset's files"""
+    stats = [os.stat(path) for path in dataset_files(dataset_path)]
+    return {"size": sum(st.st_size for st in stats), "mtime_ns": max(st.st_mtime_ns for st in stats)}
+
+
+def _encode_text(values):
+    """Pack a sequence of strings into (offsets, utf-8 bytes, null mask) arrays"""
+    import pandas as pd
+    nulls = np.zeros(len(values), dtype=bool)
+    encoded = []
+    for i, value in enumerate(values):
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            nulls[i] = True
+            encoded.append(b'')
+        else:
+            encoded.append(str(value).encode('utf-8'))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return offsets, buffer, nulls
+
+
+class TextColumn:
+    """Strings packed as utf-8 bytes plus int64 offsets, decoded one value at a time
+
+    The offsets need not start at 0: a view() shares the whole buffer of its column.
+    """
+    __slots__ = ('offsets', 'buffer', 'nulls')
+
+    def __init__(self, offsets, buffer, nulls):
+        self.offsets = offsets
+        self.buffer = buffer
+        self.nulls = nulls
+
+    @classmethod
+    def from_values(cls, values):
+        return cls(*_encode_text(values))
+
+    def arrays(self):
+        return self.offsets, self.buffer, self.nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.nulls[i]:
+            return None
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def view(self, start, stop):
+        """Return values start to stop as a TextColumn sharing this one's arrays"""
+        return TextColumn(self.offsets[start:stop + 1], self.buffer, self.nulls[start:stop])
+
+    def _text(self):
+        return self.buffer[self.offsets[0]:self.offsets[-1]]
+
+    def compress(self, keep):
+        """Return a TextColumn of the values where the boolean mask keep is set"""
+        lengths = np.diff(self.offsets)
+        offsets = np.zeros(int(np.count_nonzero(keep)) + 1, dtype=np.int64)
+        np.cumsum(lengths[keep], out=offsets[1:])
+        return TextColumn(offsets, self._text()[np.repeat(keep, lengths)], self.nulls[keep])
+
+    @classmethod
+    def concat(cls, columns):
+        """Return one TextColumn holding the values of several, in order"""
+        texts = [column._text() for column in columns]
+        starts = np.cumsum([0] + [len(text) for text in texts[:-1]])
+        offsets = np.concatenate([[0]] + [
+            column.offsets[1:] - column.offsets[0] + start for column, start in zip(columns, starts)])
+        return cls(offsets.astype(np.int64), np.concatenate(texts),
+                   np.concatenate([column.nulls for column in columns]))
+
+    def tolist(self, start=0, stop=None):
+        """Return values start to stop (by default all of them) as a list of str or None"""
+        stop = len(self) if stop is None else stop
+        raw = self.buffer[self.offsets[start]:self.offsets[stop]].tobytes()
+        bounds = (self.offsets[start:stop + 1] - self.offsets[start]).tolist()
+        values = [raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+        for i in np.flatnonzero(self.nulls[start:stop]):
+            values[i] = None
+        return values
+
+
+class TextColumnBuilder:
+    """Appends strings to a growing utf-8 buffer and builds a TextColumn without re-copying it"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array('q', [0])
+        self.nulls = array('b')
+
+    def extend(self, values):
+        import pandas as pd
+        for value in values:
+            if value is None or (not isinstance(value, str) and pd.isna(value)):
+                self.nulls.append(1)
+            else:
+                self.buffer += str(value).encode('utf-8')
+                self.nulls.append(0)
+            self.offsets.append(len(self.buffer))
+
+    def finish(self):
+        return TextColumn(np.frombuffer(self.offsets, dtype=np.int64),
+                          np.frombuffer(self.buffer, dtype=np.uint8),
+                          np.frombuffer(self.nulls, dtype=np.int8).astype(bool))
+
+
+class TextListColumnBuilder:
+    """Appends per-recipe lists of strings and builds a TextListColumn"""
+
+    def __init__(self):
+        self.row_offsets = array('q', [0])
+        self.items = TextColumnBuilder()
+
+    def extend(self, lists):
+        for items in lists:
+            self.items.extend(items)
+            self.row_offsets.append(len(self.items.offsets) - 1)
+
+    def finish(self):
+        return TextListColumn(np.frombuffer(self.row_offsets, dtype=np.int64), self.items.finish())
+
+
+class TextListColumn:
+    """Per-recipe lists of strings: row offsets into one packed TextColumn of items, which a
+    view() shares whole"""
+    __slots__ = ('row_offsets', 'items')
+
+    def __init__(self, row_offsets, items):
+        self.row_offsets = row_offsets
+        self.items = items
+
+    @classmethod
+    def from_lists(cls, lists):
+        row_offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(items) for items in lists], out=row_offsets[1:])
+        return cls(row_offsets, TextColumn.from_values([item for items in lists for item in items]))
+
+    def arrays(self):
+        return (self.row_offsets, *self.items.arrays())
+
+    def __len__(self):
+        return len(self.row_offsets) - 1
+
+    def __getitem__(self, i):
+        return [self.items[j] for j in range(self.row_offsets[i], self.row_offsets[i + 1])]
+
+    def view(self, start, stop):
+        """Return rows start to stop as a TextListColumn sharing this one's arrays"""
+        return TextListColumn(self.row_offsets[start:stop + 1], self.items)
+
+    def _items(self):
+        return self.items.view(self.row_offsets[0], self.row_offsets[-1])
+
+    def compress(self, keep):
+        """Return a TextListColumn of the rows where the boolean mask keep is set"""
+        lengths = np.diff(self.row_offsets)
+        row_offsets = np.zeros(int(np.count_nonzero(keep)) + 1, dtype=np.int64)
+        np.cumsum(lengths[keep], out=row_offsets[1:])
+        return TextListColumn(row_offsets, self._items().compress(np.repeat(keep, lengths)))
+
+    @classmethod
+    def concat(cls, columns):
+        """Return one TextListColumn holding the rows of several, in order"""
+        starts = np.cumsum([0] + [column.row_offsets[-1] - column.row_offsets[0] for column in columns[:-1]])
+        row_offsets = np.concatenate([[0]] + [
+            column.row_offsets[1:] - column.row_offsets[0] + start for column, start in zip(columns, starts)])
+        return cls(row_offsets.astype(np.int64), TextColumn.concat([column._items() for column in columns]))
+
+
+class RecipeRecord:
+    """A search hit: one recipe's fields and its match score, with read-only mapping access
+
+    parsed holds the ingredients and instructions already split into lists at index time.
+    """
+    __slots__ = ('id', 'fields', 'match_score', 'parsed')
+
+    def __init__(self, id, fields, match_score=0.0, parsed=None):
+        self.id = id
+        self.fields = fields
+        self.match_score = match_score
+        self.parsed = parsed
+
+    def __getitem__(self, key):
+        if key == 'match_score':
+            return self.match_score
+        return self.fields[key]
+
+    def __contains__(self, key):
+        return key == 'match_score' or key in self.fields
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return [*self.fields, 'match_score']
+
+    def to_dict(self):
+        return {**self.fields, 'match_score': self.match_score}
+
+    def __repr__(self):
+        return f"RecipeRecord(id={self.id}, recipe_name={self.fields.get('recipe_name')!r}, match_score={self.match_score:.4f})"
+
+
+class RecipeIndex:
+    """Fitted TF-IDF vocabulary, IDF weights, CSR matrix and recipe metadata
+
+    Recipe columns are kept columnar (numeric arrays and packed TextColumns) so that an
+    index loaded with mmap=True is backed by the page cache and shared between processes.
+    ids are the stable recipe ids of the rows, which stay with a recipe when segments are
+    merged; applied_seq is the last change-log entry folded into the index. postings, the
+    term -> recipe form of the vectors used for pruned top-k search, is built on first use
+    unless it was loaded with the index.
+    """
+
+    def __init__(self, vocabulary, idf, recipe_vectors, columns, constraints, lists,
+                 dataset_hash=None, dataset_stat=None, version=None, ids=None,
+                 next_id=None, applied_seq=0, postings=None):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.recipe_vectors = recipe_vectors
+        self.columns = columns
+        self.constraints = constraints
+        self.lists = lists
+        self.dataset_hash = dataset_hash
+        self.dataset_stat = dataset_stat
+        # Identifies this build of the index; caches of search results are keyed on it.
+        self.version = version or uuid.uuid4().hex
+        self.ids = ids if ids is not None else np.arange(recipe_vectors.shape[0], dtype=np.int64)
+        if next_id is None:
+            next_id = int(self.ids.max()) + 1 if len(self.ids) else 0
+        self.next_id = next_id
+        self.applied_seq = applied_seq
+        self._id_order = None
+        self._postings = postings
+
+    @property
+    def postings(self):
+        if self._postings is None:
+            self._postings = TermPostings.from_vectors(self.recipe_vectors)
+        return self._postings
+
+    @classmethod
+    def build(cls, recipes_df, vectorizer, recipe_vectors, dataset_path=None, vocabulary=None, **kwargs):
+        """Capture a fitted vectorizer and its dataset as an index
+
+        vocabulary may pass the vectorizer's terms in id order when they are already known;
+        other keyword arguments (ids, next_id, ...) are passed to the new index.
+        """
+        import pandas as pd
+        terms = vocabulary
+        if terms is None:
+            terms = [None] * len(vectorizer.vocabulary_)
+            for term, i in vectorizer.vocabulary_.items():
+                terms[i] = term
+        columns = {
+            name: recipes_df[name].to_numpy() if pd.api.types.is_numeric_dtype(recipes_df[name])
+            else TextColumn.from_values(recipes_df[name].tolist())
+            for name in recipes_df.columns if name != 'recipe_text'
+        }
+        lists = {
+            name: TextListColumn.from_lists([parse(value) for value in recipes_df[name].tolist()])
+            for name, parse in LIST_PARSERS.items() if name in recipes_df.columns
+        }
+        cook_times = columns.get('cook_time')
+        constraints = ConstraintIndex.build(
+            columns['ingredients'].tolist() if 'ingredients' in columns else [],
+            cook_times if isinstance(cook_times, np.ndarray) else None,
+        )
+        dataset_hash = dataset_fingerprint(dataset_path) if dataset_path else None
+        stat = dataset_stat(dataset_path) if dataset_path else None
+        return cls(terms, np.asarray(vectorizer.idf_), sparse.csr_matrix(recipe_vectors),
+                   columns, constraints, lists, dataset_hash, stat, **kwargs)
+
+    @classmethod
+    def merge(cls, segments, keeps=None, **kwargs):
+        """Concatenate index segments that share one vocabulary, dropping rows not in keeps
+
+        keeps holds a boolean mask per segment (None keeps every row). The vocabulary,
+        IDF weights and dataset identity are those of the first segment; keyword
+        arguments (version, next_id, applied_seq) are passed to the new index.
+        """
+        if keeps is None:
+            keeps = [None] * len(segments)
+        keeps = [np.ones(len(segment), dtype=bool) if keep is None else keep
+                 for segment, keep in zip(segments, keeps)]
+        first = segments[0]
+        vectors = sparse.vstack([segment.recipe_vectors[keep] for segment, keep in zip(segments, keeps)],
+                                format='csr')
+        columns = {}
+        for name, column in first.columns.items():
+            parts = [segment.columns[name] for segment in segments]
+            if isinstance(column, TextColumn):
+                columns[name] = TextColumn.concat([part.compress(keep) for part, keep in zip(parts, keeps)])
+            else:
+                columns[name] = np.concatenate([np.asarray(part)[keep] for part, keep in zip(parts, keeps)])
+        lists = {
+            name: TextListColumn.concat([segment.lists[name].compress(keep)
+                                         for segment, keep in zip(segments, keeps)])
+            for name in first.lists
+        }
+        cook_times = columns.get('cook_time')
+        constraints = ConstraintIndex.merge([segment.constraints for segment in segments], keeps,
+                                            cook_times if isinstance(cook_times, np.ndarray) else None)
+        ids = np.concatenate([segment.ids[keep] for segment, keep in zip(segments, keeps)])
+        kwargs.setdefault('next_id', max(segment.next_id for segment in segments))
+        return cls(first.vocabulary, first.idf, vectors, columns, constraints, lists,
+                   first.dataset_hash, first.dataset_stat, ids=ids, **kwargs)
+
+    def view(self, first, stop):
+        """Return an index of rows first to stop that shares this one's arrays instead of
+        copying them; only the vectors' row pointers are new"""
+        vectors = self.recipe_vectors
+        start, end = vectors.indptr[first], vectors.indptr[stop]
+        # Set rather than passed in, as the constructor copies views much smaller than their array.
+        recipe_vectors = sparse.csr_matrix((stop - first, vectors.shape[1]), dtype=vectors.dtype)
+        recipe_vectors.data = vectors.data[start:end]
+        recipe_vectors.indices = vectors.indices[start:end]
+        recipe_vectors.indptr = vectors.indptr[first:stop + 1] - start
+        columns = {name: column.view(first, stop) if isinstance(column, TextColumn) else column[first:stop]
+                   for name, column in self.columns.items()}
+        lists = {name: column.view(first, stop) for name, column in self.lists.items()}
+        return RecipeIndex(self.vocabulary, self.idf, recipe_vectors, columns, self.constraints.view(first, stop),
+                           lists, self.dataset_hash, self.dataset_stat, self.version, self.ids[first:stop],
+                           self.next_id, self.applied_seq, self.postings.view(first, stop))
+
+    def __len__(self):
+        return self.recipe_vectors.shape[0]
+
+    def positions(self, ids):
+        """Return the row of each recipe id, or -1 for ids not in this index"""
+        if self._id_order is None:
+            order = np.argsort(self.ids, kind='stable')
+            self._id_order = (order, self.ids[order])
+        order, sorted_ids = self._id_order
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[found] == ids, order[found], -1)
+
+    def make_vectorizer(self):
+        """Return a TfidfVectorizer equivalent to the one the index was fitted with"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(stop_words='english')
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(self.vocabulary)}
+        vectorizer.idf_ = self.idf
+        return vectorizer
+
+    def record(self, i):
+        """Return recipe i as a dict of column name to value"""
+        return {name: column[i] for name, column in self.columns.items()}
+
+    def parsed(self, i):
+        """Return recipe i's ingredients and instructions as the lists parsed at index time"""
+        return {name: column[i] for name, column in self.lists.items()}
+
+    def to_dataframe(self):
+        """Return the recipe metadata as a DataFrame"""
+        import pandas as pd
+        return pd.DataFrame({
+            name: column.tolist() if isinstance(column, TextColumn) else column
+            for name, column in self.columns.items()
+        })
+
+    def save(self, index_dir):
+        """Write the index to a directory, replacing any previous artifact atomically"""
+        tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        def save_array(name, array):
+            np.save(os.path.join(tmp_dir, name), np.ascontiguousarray(array))
+            return name
+
+        vectors = self.recipe_vectors
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "created": time.time(),
+            "version": self.version,
+            "dataset_hash": self.dataset_hash,
+            "dataset_stat": self.dataset_stat,
+            "next_id": self.next_id,
+            "applied_seq": self.applied_seq,
+            "n_recipes": vectors.shape[0],
+            "n_terms": vectors.shape[1],
+            "vocabulary": [save_array(f"vocabulary.{part}.npy", a)
+                           for part, a in zip(TEXT_PARTS, _encode_text(self.vocabulary))],
+            "idf": save_array("idf.npy", self.idf),
+            "ids": save_array("ids.npy", self.ids),
+            "vectors": {
+                "data": save_array("vectors.data.npy", vectors.data),
+                "indices": save_array("vectors.indices.npy", vectors.indices),
+                "indptr": save_array("vectors.indptr.npy", vectors.indptr),
+            },
+            "postings": [save_array(f"postings.{part}.npy", a)
+                         for part, a in zip(("offsets", "rows", "weights", "term_max"), self.postings.arrays())],
+            "columns": [],
+            "lists": {
+                name: [save_array(f"list.{name}.{part}.npy", a)
+                       for part, a in zip(("row_offsets", *TEXT_PARTS), column.arrays())]
+                for name, column in self.lists.items()
+            },
+            "constraints": {
+                "tokens": [save_array(f"constraints.tokens.{part}.npy", a)
+                           for part, a in zip(TEXT_PARTS, _encode_text(self.constraints.tokens))],
+                "postings_offsets": save_array("constraints.postings_offsets.npy",
+                                               self.constraints.postings_offsets),
+                "postings": save_array("constraints.postings.npy", self.constraints.postings),
+                "time_order": None,
+                "sorted_times": None,
+            },
+        }
+        if self.constraints.time_order is not None:
+            manifest["constraints"]["time_order"] = save_array(
+                "constraints.time_order.npy", self.constraints.time_order)
+            manifest["constraints"]["sorted_times"] = save_array(
+                "constraints.sorted_times.npy", self.constraints.sorted_times)
+        for i, (name, column) in enumerate(self.columns.items()):
+            if isinstance(column, TextColumn):
+                manifest["columns"].append({
+                    "name": name,
+                    "kind": "text",
+                    "files": [save_array(f"col{i}.{part}.npy", a)
+                              for part, a in zip(TEXT_PARTS, column.arrays())],
+                })
+            else:
+                manifest["columns"].append({
+                    "name": name,
+                    "kind": "numeric",
+                    "files": [save_array(f"col{i}.npy", column)],
+                })
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        old_dir = f"{index_dir}.old-{os.getpid()}"
+        if os.path.exists(index_dir):
+            os.rename(index_dir, old_dir)
+        os.rename(tmp_dir, index_dir)
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+
+    @staticmethod
+    def read_manifest(index_dir):
+        """Return the manifest of an index directory, or None if there is no usable one"""
+        try:
+            with open(os.path.join(index_dir, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+            return None
+        return manifest
+
+    @classmethod
+    def load(cls, index_dir, manifest=None, mmap=False):
+        """Load an index previously written with save(), memory-mapping its arrays if mmap is set"""
+        manifest = manifest or cls.read_manifest(index_dir)
+        if manifest is None:
+            raise FileNotFoundError(f"No recipe index found in {index_dir}")
+
+        def load_array(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode='r' if mmap else None)
+
+        vocabulary = TextColumn(*[load_array(name) for name in manifest["vocabulary"]]).tolist()
+        vectors = sparse.csr_matrix(
+            (load_array(manifest["vectors"]["data"]),
+             load_array(manifest["vectors"]["indices"]),
+             load_array(manifest["vectors"]["indptr"])),
+            shape=(manifest["n_recipes"], manifest["n_terms"]),
+        )
+        columns = {}
+        for column in manifest["columns"]:
+            arrays = [load_array(name) for name in column["files"]]
+            columns[column["name"]] = arrays[0] if column["kind"] == "numeric" else TextColumn(*arrays)
+        files = manifest["constraints"]
+        constraints = ConstraintIndex(
+            TextColumn(*[load_array(name) for name in files["tokens"]]).tolist(),
+            load_array(files["postings_offsets"]),
+            load_array(files["postings"]),
+            load_array(files["time_order"]) if files["time_order"] else None,
+            load_array(files["sorted_times"]) if files["sorted_times"] else None,
+        )
+        lists = {}
+        for name, list_files in manifest["lists"].items():
+            row_offsets, *item_arrays = [load_array(f) for f in list_files]
+            lists[name] = TextListColumn(row_offsets, TextColumn(*item_arrays))
+        return cls(vocabulary, load_array(manifest["idf"]), vectors, columns, constraints, lists,
+                   manifest["dataset_hash"], manifest["dataset_stat"], manifest["version"],
+                   load_array(manifest["ids"]), manifest["next_id"], manifest["applied_seq"],
+                   TermPostings(*[load_array(name) for name in manifest["postings"]]))
+
+    @classmethod
+    def load_for_dataset(cls, index_dir, dataset_path, mmap=False):
+        """Load the index if it was built from the current contents of dataset_path, else return None"""
+        manifest = cls.read_manifest(index_dir)
+        if manifest is None or not os.path.exists(dataset_path):
+            return None
+        if manifest["dataset_stat"] != dataset_stat(dataset_path):
+            if manifest["dataset_hash"] != dataset_fingerprint(dataset_path):
+                return None
+        return cls.load(index_dir, manifest, mmap)
@@ -0,0 +1,35 @@
+import re
+
+QUOTED_ITEM_PATTERN = re.compile(r'\'([^\']+)\'|\"([^\"]+)\"')
+
+
+def _quoted_items(text):
+    return [single or double for single, double in QUOTED_ITEM_PATTERN.findall(text[1:-1])]
+
+
+def parse_ingredients(value):
+    """Split an ingredients field (list literal or comma-separated text) into a list of items"""
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str):
+        return []
+    if value.startswith('[') and value.endswith(']'):
+        return _quoted_items(value)
+    return [item.strip() for item in value.split(',')]
+
+
+def parse_instructions(value):
+    """Split an instructions field (list literal, sentences or lines) into a list of steps"""
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str):
+        return []
+    if value.startswith('[') and value.endswith(']'):
+        return _quoted_items(value)
+    if '. ' in value:
+        raw_instructions = value.replace('. ', '.|').split('|')
+    elif '\n' in value:
+        raw_instructions = value.split('\n')
+    else:
+        return [value.strip()]
+    return [instr.strip() for instr in raw_instructions if instr.strip()]
@@ -0,0 +1,160 @@
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from metrics import EMPTY_FILTER_FALLBACKS, REGISTRY, Counter, Histogram, span
+
+SHARD_REQUESTS = REGISTRY.register(Counter(
+    "recipe_shard_requests_total", "Shard searches sent by the coordinator, by shard and outcome",
+    ("shard", "outcome")))
+SHARD_SECONDS = REGISTRY.register(Histogram(
+    "recipe_shard_request_seconds", "Time for shard servers to answer the coordinator, by shard",
+    labelnames=("shard",)))
+
+
+class ShardUnavailable(Exception):
+    """Raised when no shard server answers a search"""
+
+
+class ShardClient:
+    """JSON-over-HTTP client of one shard server, reusing up to pool_size kept-alive connections
+
+    timeout bounds connecting and each read, in seconds.
+    """
+
+    def __init__(self, url, timeout=1.0, pool_size=8):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError(f"shard URL must be http://host:port, got {url!r}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(pool_size)
+
+    def post(self, path, payload):
+        """POST payload as JSON and return the decoded response; raises OSError or HTTPException"""
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json"}
+        while True:
+            try:
+                connection, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+            try:
+                connection.request("POST", path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                # The server may have closed an idle connection; retry those on a new one.
+                if reused and not isinstance(e, TimeoutError):
+                    continue
+                raise
+            break
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+        if response.status != 200:
+            raise http.client.HTTPException(f"HTTP {response.status}: {data[:200]!r}")
+        return json.loads(data)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class Coordinator:
+    """Scatter-gather search over shard servers, each a RecipeEngine serving one shard
+
+    A search is sent to the /shard/search endpoint of every shard at once. Each returns its
+    top_n with the recipes' scores and catalog rows, and the merged top_n by score, ties by
+    row, is what one engine over the whole catalog returns. As there, constraints no
+    recipe meets are dropped: if no shard matched them, every shard is asked again without
+    them. Shards that fail or take longer than timeout seconds are left out, and the search
+    is marked partial; ShardUnavailable is raised only if none answers.
+    """
+
+    def __init__(self, urls, timeout=1.0, pool_size=8):
+        if not urls:
+            raise ValueError("a coordinator needs at least one shard URL")
+        self.clients = [ShardClient(url, timeout, pool_size) for url in urls]
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(len(self.clients) * pool_size, thread_name_prefix="scatter")
+        self.searches = 0
+        self.partial = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """A Coordinator of the comma-separated SEARCH_SHARDS URLs, or None if it is not set
+
+        SHARD_TIMEOUT (seconds, default 1) and SHARD_POOL_SIZE (connections kept per
+        shard, default 8) tune it.
+        """
+        urls = [url.strip() for url in os.environ.get("SEARCH_SHARDS", "").split(",") if url.strip()]
+        if not urls:
+            return None
+        return cls(urls, float(os.environ.get("SHARD_TIMEOUT", 1.0)), int(os.environ.get("SHARD_POOL_SIZE", 8)))
+
+    def _call(self, client, payload):
+        start = time.perf_counter()
+        result = client.post("/shard/search", payload)
+        SHARD_SECONDS.observe(time.perf_counter() - start, client.url)
+        return result
+
+    def _scatter(self, payload):
+        """Return the responses of the shards that answered in time and the URLs of the others"""
+        futures = {self._executor.submit(self._call, client, payload): client for client in self.clients}
+        done, _ = wait(futures, timeout=self.timeout)
+        responses, failed = [], []
+        for future, client in futures.items():
+            if future not in done:
+                outcome = "timeout"
+                future.cancel()
+            elif future.exception() is not None:
+                outcome = "error"
+            else:
+                outcome = "ok"
+                responses.append(future.result())
+            SHARD_REQUESTS.inc(1, client.url, outcome)
+            if outcome != "ok":
+                failed.append(client.url)
+        return responses, failed
+
+    def search(self, query, constraints=None, top_n=3):
+        """Return (recipes, failed): the merged top_n recipe summaries and the URLs of the
+        shards left out"""
+        payload = {"query": query, "constraints": constraints or {}, "top_n": top_n}
+        with span("scatter"):
+            responses, failed = self._scatter(payload)
+            if constraints and responses and not any(response["matched"] for response in responses):
+                EMPTY_FILTER_FALLBACKS.inc()
+                responses, failed = self._scatter({**payload, "constraints": {}})
+        with self._lock:
+            self.searches += 1
+            self.partial += bool(failed)
+        if not responses:
+            raise ShardUnavailable(f"no shard server answered: {', '.join(failed)}")
+        if failed:
+            print(f"Partial search results, shards not answering: {', '.join(failed)}")
+        hits = [hit for response in responses for hit in response["recipes"]]
+        hits.sort(key=lambda hit: (-hit["score"], hit["row"]))
+        return [hit["recipe"] for hit in hits[:top_n]], failed
+
+    def stats(self):
+        return {
+            "shards": [client.url for client in self.clients],
+            "timeout": self.timeout,
+            "searches": self.searches,
+            "partial": self.partial,
+        }
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be queued because the server is at capacity"""
+
+
+class BoundedExecutor:
+    """Thread pool for request work with a bound on running plus queued tasks
+
+    At most max_workers tasks run at once and at most max_queue more wait for a thread;
+    submit() raises Overloaded beyond that instead of letting the backlog (and every
+    request's latency) grow without limit.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="search")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs) and return its Future; raises Overloaded when full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded()
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def stats(self):
+        """Return the pool size, queue bound and task counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class MicroBatcher:
+    """Coalesces items submitted from many threads into batches processed by one call
+
+    A batch opens with the first waiting item and is processed once max_batch items are
+    waiting or window seconds have passed, whichever comes first, by
+    process_batch(items), which returns one result per item. At most max_queue items
+    wait at once; submit() raises Overloaded beyond that. The batching thread starts on
+    the first submit in each process, so a batcher created before a fork works after it.
+    """
+
+    def __init__(self, process_batch, window, max_batch, max_queue):
+        self.process_batch = process_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self._waiting = deque()
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.completed = 0
+        self.rejected = 0
+        self._pid = None
+
+    def submit(self, item):
+        """Queue item for the next batch and return a Future of its result; raises Overloaded when full"""
+        future = Future()
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded()
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="search-batcher", daemon=True).start()
+            self._waiting.append((item, future))
+            if len(self._waiting) == 1 or len(self._waiting) >= self.max_batch:
+                self._cond.notify()
+        return future
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._waiting:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while len(self._waiting) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._waiting.popleft() for _ in range(min(self.max_batch, len(self._waiting)))]
+
+    def _run(self):
+        while True:
+            # Requests that timed out and were cancelled while waiting are dropped here.
+            batch = [(item, future) for item, future in self._next_batch()
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.process_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            with self._cond:
+                self.batches += 1
+                self.completed += len(batch)
+
+    def stats(self):
+        """Return the batching settings and counters"""
+        with self._cond:
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "max_queue": self.max_queue,
+                "waiting": len(self._waiting),
+                "batches": self.batches,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
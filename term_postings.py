@@ -0,0 +1,143 @@
+import numpy as np
+
+# Slack on score bounds, far above the rounding error of summing a few hundred weights, so
+# that no recipe is pruned because its bound was rounded below its actual score.
+BOUND_SLACK = 1e-9
+# Candidates scored exactly in the first round before the threshold is raised again; each
+# further round scores twice as many, in case the threshold rises slowly.
+SCORE_BATCH = 256
+
+
+class TermPostings:
+    """Term -> (recipe row, weight) postings of a TF-IDF matrix with each term's largest weight
+
+    This is the column-major form of the recipe vectors: the rows containing term t are
+    rows[offsets[t]:offsets[t + 1]], in row order, with their weights for t alongside.
+    top_candidates() uses it for exact top-k retrieval with max-score pruning. A view()
+    holds only the rows of a row_range, renumbered from 0, over the same arrays; its
+    term_max are those of all rows, which still bound its weights.
+    """
+
+    def __init__(self, offsets, rows, weights, term_max, row_range=None):
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+        self.term_max = term_max
+        self.row_range = row_range
+
+    @classmethod
+    def from_vectors(cls, recipe_vectors):
+        columns = recipe_vectors.tocsc()
+        columns.sort_indices()
+        term_max = np.zeros(columns.shape[1])
+        lengths = np.diff(columns.indptr)
+        nonempty = lengths > 0
+        term_max[nonempty] = np.maximum.reduceat(columns.data, columns.indptr[:-1][nonempty])
+        return cls(columns.indptr.astype(np.int64), columns.indices, columns.data, term_max)
+
+    def arrays(self):
+        return self.offsets, self.rows, self.weights, self.term_max
+
+    def view(self, first, stop):
+        """Return the postings of rows first to stop, sharing these arrays"""
+        return TermPostings(self.offsets, self.rows, self.weights, self.term_max, (first, stop))
+
+    def postings_size(self, terms):
+        """Total number of postings of the given terms"""
+        if self.row_range is not None:
+            return sum(end - start for start, end in map(self._span, terms))
+        return int(np.sum(self.offsets[terms + 1] - self.offsets[terms]))
+
+    def _span(self, term):
+        start, end = int(self.offsets[term]), int(self.offsets[term + 1])
+        if self.row_range is not None:
+            first, stop = np.searchsorted(self.rows[start:end], self.row_range)
+            start, end = start + int(first), start + int(stop)
+        return start, end
+
+    def _postings(self, term):
+        start, end = self._span(term)
+        rows = self.rows[start:end]
+        if self.row_range is not None:
+            rows = rows - self.row_range[0]
+        return rows, self.weights[start:end]
+
+    def top_candidates(self, terms, weights, top_n, score_rows, n_rows, mask=None):
+        """Return (rows, scores) of recipes scored exactly that include the top_n of the query
+
+        terms and weights are the query's nonzero TF-IDF entries, score_rows(rows) returns
+        the exact scores of some of the n_rows rows, and mask limits the allowed rows.
+        Every allowed recipe scoring at least the top_n-th best score is among the rows
+        returned, so ranking them gives the exhaustive result (if fewer than top_n recipes
+        score above zero, all of those are returned).
+
+        A recipe's score is bounded by the sum over query terms of the query weight times
+        the term's largest weight. A threshold is first taken from the best postings of
+        the strongest term; the weakest terms whose bounds add up to less than it cannot
+        lift a recipe to the threshold alone, so only recipes containing one of the other
+        terms are candidates. Candidates are then scored exactly, those with the highest
+        bounds first, raising the threshold as better scores are found and dropping the
+        candidates whose bound falls below it.
+        """
+        bounds = weights * self.term_max[terms]
+        order = np.argsort(bounds, kind='stable')
+        terms, weights, bounds = terms[order], weights[order], bounds[order]
+
+        # The threshold starts at the top_n-th score among the best postings of the strongest term.
+        rows, term_weights = self._postings(terms[-1])
+        if mask is not None:
+            allowed = mask[rows]
+            rows, term_weights = rows[allowed], term_weights[allowed]
+        if len(rows) > top_n:
+            rows = rows[np.argpartition(-term_weights, top_n - 1)[:top_n]]
+        scored_rows, scores = [rows], [score_rows(rows)]
+        threshold = _kth_largest(scores[0], top_n)
+
+        # The weak terms: the longest run of smallest bounds adding up to less than the threshold.
+        cumulative = np.cumsum(bounds)
+        n_weak = int(np.searchsorted(cumulative, threshold - BOUND_SLACK, side='left'))
+        weak_bound = cumulative[n_weak - 1] if n_weak else 0.0
+
+        # Upper bounds of the rows containing a strong term; rows with only weak ones are out.
+        if n_weak == len(terms) - 1:
+            candidates, term_weights = self._postings(terms[-1])
+            bounds = term_weights * weights[-1] + weak_bound
+            eligible = ~np.isin(candidates, scored_rows[0])
+            if mask is not None:
+                eligible &= mask[candidates]
+        else:
+            partial = np.zeros(n_rows)
+            for term, weight in zip(terms[n_weak:], weights[n_weak:]):
+                rows, term_weights = self._postings(term)
+                partial[rows] += term_weights * weight
+            eligible = partial > 0
+            eligible[scored_rows[0]] = False
+            if mask is not None:
+                eligible &= mask
+            candidates = np.flatnonzero(eligible)
+            bounds = partial[candidates] + weak_bound
+            eligible = np.ones(len(candidates), dtype=bool)
+        eligible &= bounds + BOUND_SLACK >= threshold
+        candidates, bounds = candidates[eligible], bounds[eligible]
+
+        batch = SCORE_BATCH
+        while len(candidates):
+            if len(candidates) > batch:
+                best = np.argpartition(-bounds, batch - 1)[:batch]
+            else:
+                best = np.arange(len(candidates))
+            scored_rows.append(candidates[best])
+            scores.append(score_rows(candidates[best]))
+            threshold = max(threshold, _kth_largest(np.concatenate(scores), top_n))
+            keep = bounds + BOUND_SLACK >= threshold
+            keep[best] = False
+            candidates, bounds = candidates[keep], bounds[keep]
+            batch *= 2
+        return np.concatenate(scored_rows), np.concatenate(scores)
+
+
+def _kth_largest(values, k):
+    """The k-th largest value, or 0 if there are fewer than k"""
+    if len(values) < k or k <= 0:
+        return 0.0
+    return float(np.partition(values, len(values) - k)[len(values) - k])